@@ -0,0 +1,137 @@
+# db.py
+import contextlib
+import hashlib
+import os
+import sqlite3
+import threading
+import aiosqlite
+from urllib.request import pathname2url
+
+# Настройки соединения: WAL позволяет читать БД во время записи, остальное снижает число fsync
+# и держит временные таблицы и кэш страниц (64 МБ) в памяти
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+)
+# Для соединений только на чтение режим журнала и fsync не настраиваются: их задает пишущая сторона
+_READ_PRAGMAS = (
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+)
+
+# Размер кэша подготовленных выражений соединения. Тексты запросов модулей задаются один раз
+# в константах SQL_* (раздел "SQL-ЗАПРОСЫ"), поэтому соединение берет их из кэша, и каждый
+# из них компилируется SQLite один раз за время жизни соединения
+CACHED_STATEMENTS = 256
+
+# Размер хэша заголовка в байтах. Уникальность новостей проверяется по этому ключу
+# фиксированной длины, а не по полному тексту заголовка
+TITLE_HASH_SIZE = 16
+
+# Соединения sqlite3 нельзя делить между потоками, поэтому у каждого потока
+# (event loop, потоки пула) свои долгоживущие соединения
+_LOCAL = threading.local()
+
+
+def open_connection(db_name: str, read_only: bool = False, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Открывает новое соединение с БД с настройками _PRAGMAS.
+    read_only открывает БД в режиме mode=ro: в режиме WAL такие соединения читают параллельно с записью.
+    Таймаут ожидания блокировки (busy_timeout) - 5 секунд, по умолчанию sqlite3.connect.
+    """
+    if read_only:
+        uri = f"file:{pathname2url(os.path.abspath(db_name))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, cached_statements=CACHED_STATEMENTS,
+                               check_same_thread=check_same_thread)
+    else:
+        conn = sqlite3.connect(db_name, cached_statements=CACHED_STATEMENTS,
+                               check_same_thread=check_same_thread)
+    for pragma in _READ_PRAGMAS if read_only else _PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _thread_connection(db_name: str, read_only: bool) -> sqlite3.Connection:
+    """Долгоживущее соединение текущего потока: открывается один раз, затем переиспользуется"""
+    connections = getattr(_LOCAL, 'connections', None)
+    if connections is None:
+        connections = _LOCAL.connections = {}
+
+    conn = connections.get((db_name, read_only))
+    if conn is None:
+        conn = connections[(db_name, read_only)] = open_connection(db_name, read_only)
+    return conn
+
+
+def get_connection(db_name: str) -> sqlite3.Connection:
+    """
+    Возвращает долгоживущее соединение с БД для текущего потока.
+    Соединение открывается и настраивается один раз, затем переиспользуется.
+    """
+    return _thread_connection(db_name, read_only=False)
+
+
+def get_read_connection(db_name: str) -> sqlite3.Connection:
+    """
+    Возвращает долгоживущее соединение текущего потока только для чтения (mode=ro).
+    Читающие потоки не ждут друг друга и пишущее соединение.
+    """
+    return _thread_connection(db_name, read_only=True)
+
+
+# Единственное пишущее соединение процесса для каждой БД, его закрепленный курсор и блокировка,
+# по очереди выдающая их потокам. Записи выстраиваются в очередь внутри процесса, а не ждут блокировку файла БД
+_WRITERS = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+@contextlib.contextmanager
+def write_transaction(db_name: str):
+    """
+    Выдает курсор пишущего соединения БД внутри транзакции BEGIN IMMEDIATE.
+    Курсор один на все транзакции: запросы выполняются без создания нового курсора,
+    а одинаковые тексты запросов берутся из кэша подготовленных выражений соединения.
+    Транзакция фиксируется при выходе из блока и откатывается при исключении.
+    """
+    with _WRITERS_LOCK:
+        writer = _WRITERS.get(db_name)
+        if writer is None:
+            conn = open_connection(db_name, check_same_thread=False)
+            writer = _WRITERS[db_name] = (conn, conn.cursor(), threading.Lock())
+    conn, cursor, lock = writer
+    with lock, conn:
+        cursor.execute("BEGIN IMMEDIATE")
+        yield cursor
+
+
+def title_hash(title: str) -> bytes:
+    """Хэш заголовка новости - ключ уникальности и поиска в таблице news"""
+    return hashlib.blake2b(title.encode('utf-8'), digest_size=TITLE_HASH_SIZE).digest()
+
+
+# Асинхронные соединения (aiosqlite) для корутин: запросы выполняются в отдельном потоке
+# соединения и не блокируют event loop
+_ASYNC_CONNECTIONS = {}
+
+
+async def get_async_connection(db_name: str) -> aiosqlite.Connection:
+    """
+    Возвращает долгоживущее асинхронное соединение с БД.
+    Соединение открывается и настраивается один раз, затем переиспользуется.
+    """
+    conn = _ASYNC_CONNECTIONS.get(db_name)
+    if conn is None:
+        conn = await aiosqlite.connect(db_name, cached_statements=CACHED_STATEMENTS)
+        for pragma in _PRAGMAS:
+            await conn.execute(pragma)
+        _ASYNC_CONNECTIONS[db_name] = conn
+    return conn
+
+
+async def close_async_connections():
+    """Закрывает все открытые асинхронные соединения"""
+    while _ASYNC_CONNECTIONS:
+        _, conn = _ASYNC_CONNECTIONS.popitem()
+        await conn.close()
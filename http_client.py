@@ -0,0 +1,66 @@
+# http_client.py
+import asyncio
+import time
+import httpx
+from urllib.parse import urlparse
+
+# Ограничение одновременных соединений и таймаут запроса по умолчанию, секунды
+CONNECTIONS_LIMIT = 40
+REQUEST_TIMEOUT = 20
+# Сколько статей одного сайта загружается одновременно
+CONNECTIONS_PER_HOST = 6
+# Сколько простаивающих соединений держать открытыми и как долго, секунды
+KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_TIMEOUT = 30
+
+# Минимальный интервал между запросами к одному хосту, секунды
+HOST_MIN_INTERVAL = 1.0
+
+# Общий клиент для RSS-лент и статей. HTTP/2 мультиплексирует все запросы к сайту
+# (ленты и статьи wired.com, cnet.com) в одном TLS-соединении без повторных рукопожатий
+_CLIENT = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Возвращает долгоживущий HTTP-клиент процесса.
+    Клиент создается при первом вызове (внутри event loop), затем переиспользуется.
+    Заголовки задаются в каждом запросе.
+    """
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        limits = httpx.Limits(max_connections=CONNECTIONS_LIMIT,
+                              max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+                              keepalive_expiry=KEEPALIVE_TIMEOUT)
+        _CLIENT = httpx.AsyncClient(http2=True, limits=limits, timeout=REQUEST_TIMEOUT,
+                                    follow_redirects=True)
+    return _CLIENT
+
+
+async def close_client():
+    """Закрывает общий HTTP-клиент"""
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
+
+class HostRateLimiter:
+    """
+    Выдерживает паузу между запросами только к одному и тому же хосту.
+    Запросы к разным сайтам не ждут друг друга.
+    """
+
+    def __init__(self, min_interval: float = HOST_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._next_slot = {}
+
+    async def wait(self, url: str):
+        """Ждет, пока к хосту ссылки снова можно обратиться, и занимает следующий слот"""
+        host = urlparse(url).hostname or ''
+        now = time.monotonic()
+        # Слот занимается до ожидания, поэтому параллельные запросы к хосту выстраиваются по очереди
+        slot = max(now, self._next_slot.get(host, 0.0))
+        self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
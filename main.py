@@ -2,26 +2,50 @@ from rss_parser import start_parsing
 from web_parser import fetch_full_texts
 from yagpt_processing import process_texts_with_yacloud_sdk
 from publisher import run_publisher
+from http_client import close_client
 import logging
 import asyncio
+import os
+import signal
 import concurrent.futures
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Общий пул потоков для синхронных задач и разбора статей: создается один раз на весь процесс.
+# Размер как у пула по умолчанию - задачи в основном ждут сеть или работают внутри lxml без GIL
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4),
+                                                  thread_name_prefix='parser')
 
-async def run_sync_in_executor(func):
 
-    loop = asyncio.get_running_loop()
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        return await loop.run_in_executor(executor, func)
+# События досрочного запуска этапов: SIGHUP будит циклы, не дожидаясь окончания паузы
+_REFRESH_RSS = asyncio.Event()
+_REFRESH_WEB = asyncio.Event()
+_REFRESH_YAGPT = asyncio.Event()
+
+
+def request_refresh():
+    """Запускает все этапы обработки досрочно"""
+    logger.info('🔄 Получен запрос на досрочное обновление')
+    for event in (_REFRESH_RSS, _REFRESH_WEB, _REFRESH_YAGPT):
+        event.set()
+
+
+async def wait_for_refresh(event: asyncio.Event, timeout: float):
+    """Ждет timeout секунд или досрочного запуска через event"""
+    try:
+        await asyncio.wait_for(event.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+    event.clear()
+
 
 async def start_rss():
     while True:
         try:
-            await run_sync_in_executor(start_parsing)
+            await start_parsing()
             logger.info(f'⏱️ Ожидание 30 минут до следующей обработки rss')
-            await asyncio.sleep(1800)
+            await wait_for_refresh(_REFRESH_RSS, 1800)
         except Exception as e:
             logger.error(f"Ошибка в start_rss: {e}")
             await asyncio.sleep(300)
@@ -30,9 +54,9 @@ async def start_web():
     while True:
         try:
             await asyncio.sleep(60)
-            await run_sync_in_executor(fetch_full_texts)
+            await fetch_full_texts()
             logger.info(f'⏱️ Ожидание 30 минут до следующей обработки web')
-            await asyncio.sleep(1800)
+            await wait_for_refresh(_REFRESH_WEB, 1800)
         except Exception as e:
             logger.error(f"Ошибка в start_web: {e}")
             await asyncio.sleep(300)
@@ -41,21 +65,30 @@ async def start_yagpt():
     while True:
         try:
             await asyncio.sleep(120)
-            await run_sync_in_executor(process_texts_with_yacloud_sdk)
+            await process_texts_with_yacloud_sdk()
             logger.info(f'⏱️ Ожидание 35 минут до следующей обработки yagpt')
-            await asyncio.sleep(2100)
+            await wait_for_refresh(_REFRESH_YAGPT, 2100)
         except Exception as e:
             logger.error(f"Ошибка в start_yagpt: {e}")
             await asyncio.sleep(300)
 
 async def main():
     print("Старт")
-    await asyncio.gather(
-        start_rss(),
-        start_web(),
-        start_yagpt(),
-        run_publisher()
-    )
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(_EXECUTOR)
+    # kill -HUP <pid> запускает парсинг и обработку сразу (на Windows сигнала нет)
+    if hasattr(signal, 'SIGHUP'):
+        loop.add_signal_handler(signal.SIGHUP, request_refresh)
+    # TaskGroup: при падении одной задачи остальные корректно отменяются
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(start_rss())
+            tg.create_task(start_web())
+            tg.create_task(start_yagpt())
+            tg.create_task(run_publisher())
+    finally:
+        # Общий HTTP-клиент живет все время работы и закрывается при остановке
+        await close_client()
 
 
 if __name__ == "__main__":
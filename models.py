@@ -0,0 +1,23 @@
+# models.py
+from dataclasses import dataclass, field
+from typing import List, Dict
+
+
+@dataclass(slots=True)
+class Article:
+    """
+    Статья, извлеченная парсером сайта.
+    Поля, которых нет на конкретном сайте, остаются со значениями по умолчанию.
+    """
+    title: str = ""
+    content: str = ""
+    author: str = ""
+    publish_date: str = ""
+    url: str = ""
+    update_date: str = ""
+    summary: str = ""
+    category: str = ""
+    rating: str = ""
+    tags: List[str] = field(default_factory=list)
+    images: List[Dict[str, str]] = field(default_factory=list)
+    chapters: List[str] = field(default_factory=list)
@@ -0,0 +1,31 @@
+# parsers/_htmlparser.py
+import threading
+import lxml.html
+from lxml import etree
+
+# Узлы, содержимое которых не нужно для извлечения текста
+_SKIP_TAGS = ('script', 'style')
+
+# Парсер lxml нельзя делить между потоками, поэтому у каждого потока пула свои
+# настроенные парсеры (по одному на кодировку), которые создаются один раз
+_LOCAL = threading.local()
+
+
+def html_parser(encoding=None) -> lxml.html.HTMLParser:
+    """Возвращает HTML-парсер текущего потока для заданной кодировки (по умолчанию UTF-8)"""
+    parsers = getattr(_LOCAL, 'parsers', None)
+    if parsers is None:
+        parsers = _LOCAL.parsers = {}
+
+    encoding = encoding or 'utf-8'
+    parser = parsers.get(encoding)
+    if parser is None:
+        parser = parsers[encoding] = lxml.html.HTMLParser(encoding=encoding, remove_comments=True)
+    return parser
+
+
+def parse_html(html_bytes: bytes, parser: lxml.html.HTMLParser):
+    """Строит lxml-дерево страницы и удаляет <script>/<style>, не трогая текст после них"""
+    tree = lxml.html.fromstring(html_bytes, parser=parser)
+    etree.strip_elements(tree, *_SKIP_TAGS, with_tail=False)
+    return tree
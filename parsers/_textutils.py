@@ -0,0 +1,81 @@
+# parsers/_textutils.py
+import re
+from datetime import datetime
+from urllib.parse import urlparse
+from lxml import etree
+
+# Шаблон и таблица для clean_text строятся один раз при импорте.
+# Пробельные управляющие символы (\n, \t, ...) не удаляются, а схлопываются в пробел
+_WS_RE = re.compile(r'\s+')
+_CTRL_TRANS = dict.fromkeys(
+    c for c in [*range(0x00, 0x20), *range(0x7f, 0xa0)] if not chr(c).isspace()
+)
+
+
+def clean_text(text):
+    """Очищает текст от лишних пробелов и символов"""
+    if not text:
+        return ""
+
+    # Удаляем непечатаемые символы (str.translate работает на C) и схлопываем пробелы
+    return _WS_RE.sub(' ', text.translate(_CTRL_TRANS).strip())
+
+
+_DATE_FORMATS = ('%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%d')
+
+
+def format_date(date_str):
+    """Форматирует дату в читаемый вид"""
+    try:
+        # Пробуем разные форматы дат
+        for fmt in _DATE_FORMATS:
+            try:
+                dt = datetime.strptime(date_str, fmt)
+                return dt.strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                continue
+        return date_str
+    except:
+        return date_str
+
+
+# --- ОБЩИЕ ПОМОЩНИКИ ДЛЯ XPATH ---
+# Проверка CSS-класса и регистронезависимый поиск подстроки в атрибуте class (XPath 1.0)
+HAS_CLASS = 'contains(concat(" ", normalize-space(@class), " "), " {} ")'
+CLASS_CONTAINS = ('contains(translate(@class, "ABCDEFGHIJKLMNOPQRSTUVWXYZ", '
+                  '"abcdefghijklmnopqrstuvwxyz"), "{}")')
+
+
+def select_first(tree, xpaths):
+    """Возвращает первый элемент, найденный по XPath-выражениям в порядке их приоритета"""
+    for xpath in xpaths:
+        found = xpath(tree)
+        if found:
+            return found[0]
+    return None
+
+
+def node_text(element):
+    """Возвращает текст элемента lxml, для <meta> - значение атрибута content"""
+    if element.tag == 'meta':
+        return element.get('content', '')
+    return element.text_content()
+
+
+def host_in_domains(url, domains):
+    """
+    Возвращает домен из domains, которому принадлежит хост URL, или None.
+    Проверяет хост и его родительские домены (www.wired.com -> wired.com) по множеству,
+    а не подстрокой во всем URL.
+    """
+    labels = (urlparse(url).hostname or '').split('.')
+    for i in range(len(labels) - 1):
+        domain = '.'.join(labels[i:])
+        if domain in domains:
+            return domain
+    return None
+
+
+def compile_xpaths(*expressions):
+    """Компилирует XPath-выражения одного поля (в порядке приоритета) один раз при импорте"""
+    return tuple(etree.XPath(expression) for expression in expressions)
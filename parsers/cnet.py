@@ -1,258 +1,251 @@
-import requests
-from bs4 import BeautifulSoup
-import re
-from datetime import datetime
+import lxml.html
+from lxml import etree
+import io
 import json
-
-
-def parse_cnet_article(url):
-    """
-    Парсит статью с CNET.com
-    """
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Referer': 'https://www.cnet.com/'
-        }
-
-
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Извлекаем основные данные
-        article_data = {
-            'title': extract_cnet_title(soup),
-            'content': extract_cnet_content(soup),
-            'author': extract_cnet_author(soup),
-            'publish_date': extract_cnet_publish_date(soup),
-            'update_date': extract_cnet_update_date(soup),
-            'summary': extract_cnet_summary(soup),
-            'tags': extract_cnet_tags(soup),
-            'category': extract_cnet_category(soup),
-            'images': extract_cnet_images(soup),
-            'rating': extract_cnet_rating(soup),
-            'url': url
-        }
-
-        return article_data
-
-    except Exception as e:
-        print(f"Ошибка при парсинге статьи: {e}")
-        return None
-
-
-def extract_cnet_title(soup):
+from models import Article
+from parsers._textutils import (HAS_CLASS, clean_text, compile_xpaths, format_date, host_in_domains, node_text,
+                                select_first)
+from parsers._htmlparser import parse_html
+
+
+def parse_cnet_article_from_html(html, url):
+    """Извлекает данные статьи CNET из уже загруженного HTML"""
+    # HTML разбирается один раз; все поля извлекаются из одного lxml-дерева
+    tree = lxml.html.fromstring(html)
+
+    # Извлекаем основные данные
+    article = Article(
+        title=extract_cnet_title(tree),
+        author=extract_cnet_author(tree),
+        publish_date=extract_cnet_publish_date(tree),
+        update_date=extract_cnet_update_date(tree),
+        summary=extract_cnet_summary(tree),
+        tags=extract_cnet_tags(tree),
+        category=extract_cnet_category(tree),
+        images=extract_cnet_images(tree),
+        rating=extract_cnet_rating(tree),
+        url=url
+    )
+    # Текст извлекается последним: при этом из дерева удаляются рекламные блоки
+    article.content = extract_cnet_content(tree)
+    return article
+
+
+# XPath-выражения перечислены по приоритету и компилируются один раз при импорте модуля.
+# Равнозначные варианты разметки одного поля объединены через "|" или "or"
+_TITLE_XPATHS = compile_xpaths(
+    '//h1[@data-testid="title" or ' + HAS_CLASS.format('articleHead') + ' or ' + HAS_CLASS.format('headline') + ']',
+    '//h1',
+    '//title'
+)
+
+
+def extract_cnet_title(tree):
     """Извлекает заголовок статьи CNET"""
-    selectors = [
-        'h1[data-testid="title"]',
-        'h1.articleHead',
-        'h1.headline',
-        'h1',
-        'title'
-    ]
-
-    for selector in selectors:
-        element = soup.select_one(selector)
-        if element and element.text.strip():
-            return clean_text(element.text.strip())
+    for title_xpath in _TITLE_XPATHS:
+        found = title_xpath(tree)
+        if found and found[0].text_content().strip():
+            return clean_text(found[0].text_content().strip())
 
     return "Заголовок не найден"
 
 
-def extract_cnet_content(soup):
-    """Извлекает основной контент статьи CNET"""
-    content_selectors = [
-        'div[data-testid="body"]',
-        'div.article-body',
-        '.c-pageArticle_content',
-        '.c-shortcodeArticle-content',
-        '.post-content'
-    ]
-
-    content_text = []
-
-    for selector in content_selectors:
-        content_element = soup.select_one(selector)
-        if content_element:
+# XPath-аналоги селекторов тела статьи: компилируются один раз и выполняются в libxml2
+_CONTENT_XPATHS = tuple(etree.XPath(expr) for expr in (
+    '//div[@data-testid="body"]',
+    '//div[' + HAS_CLASS.format('article-body') + ']',
+    '//*[' + HAS_CLASS.format('c-pageArticle_content') + ']',
+    '//*[' + HAS_CLASS.format('c-shortcodeArticle-content') + ']',
+    '//*[' + HAS_CLASS.format('post-content') + ']'
+))
+
+# Рекламные блоки внутри тела статьи
+_UNWANTED_XPATH = etree.XPath('.//*[' + ' or '.join(
+    HAS_CLASS.format(name) for name in ('ad-unit', 'inline-ad', 'c-marketplace', 'c-productComparison')
+) + ']')
+# Параграфы и подзаголовки за один проход; текст внутри рекламы и подписей к медиа
+# отсекается предикатом прямо в libxml2, без обхода родителей из Python
+_PARAGRAPHS_XPATH = etree.XPath(
+    './/*[self::p or self::h2 or self::h3 or self::h4]'
+    '[not(ancestor::aside or ancestor::figure or ancestor::div[' + HAS_CLASS.format('ad-wrapper') + '])]'
+)
+
+
+def extract_cnet_content(tree):
+    """Извлекает основной контент статьи CNET из lxml-дерева"""
+    # Абзацы пишутся сразу в буфер, без промежуточного списка
+    content_text = io.StringIO()
+    has_text = False
+
+    for content_xpath in _CONTENT_XPATHS:
+        found = content_xpath(tree)
+        if found:
+            content_element = found[0]
             # Удаляем рекламные блоки и ненужные элементы
-            for unwanted in content_element.select('.ad-unit, .inline-ad, .c-marketplace, .c-productComparison'):
-                unwanted.decompose()
-
-            # Извлекаем текст из всех параграфов
-            paragraphs = content_element.find_all(['p', 'h2', 'h3', 'h4'], recursive=True)
-
-            for element in paragraphs:
-                # Пропускаем рекламу и ненужные элементы
-                if element.find_parents(['aside', 'div.ad-wrapper', 'figure', '.c-productComparison']):
-                    continue
+            for unwanted in _UNWANTED_XPATH(content_element):
+                unwanted.drop_tree()
 
-                text = clean_text(element.get_text())
+            # Извлекаем текст из всех параграфов (реклама уже отфильтрована XPath)
+            for element in _PARAGRAPHS_XPATH(content_element):
+                text = clean_text(element.text_content())
                 if text and len(text) > 15 and not text.startswith(
                         'See at'):  # Игнорируем короткие тексты и рекламные ссылки
-                    content_text.append(text)
+                    if has_text:
+                        content_text.write('\n\n')
+                    content_text.write(text)
+                    has_text = True
 
-            if content_text:
+            # Первый контейнер с текстом найден - остальные селекторы не проверяем
+            if has_text:
                 break
 
-    return '\n\n'.join(content_text) if content_text else "Контент не найден"
+    return content_text.getvalue() if has_text else "Контент не найден"
+
+
+_AUTHOR_XPATHS = compile_xpaths(
+    '//a[@data-testid="authorLink"] | //*[' + HAS_CLASS.format('c-byline__author') + ']//a'
+    ' | //*[' + HAS_CLASS.format('author-name') + ']',
+    '//meta[@name="author"]',
+    '//*[@rel="author"]'
+)
 
 
-def extract_cnet_author(soup):
+def extract_cnet_author(tree):
     """Извлекает автора статьи CNET"""
-    author_selectors = [
-        'a[data-testid="authorLink"]',
-        '.c-byline__author a',
-        '.author-name',
-        'meta[name="author"]',
-        '[rel="author"]'
-    ]
-
-    for selector in author_selectors:
-        element = soup.select_one(selector)
-        if element:
-            if element.name == 'meta':
-                return clean_text(element.get('content', ''))
-            return clean_text(element.text)
+    element = select_first(tree, _AUTHOR_XPATHS)
+    if element is not None:
+        return clean_text(node_text(element))
 
     return "Автор не указан"
 
 
-def extract_cnet_publish_date(soup):
+_PUBLISH_DATE_XPATHS = compile_xpaths(
+    '//time[@datetime]',
+    '//*[@data-testid="publishDate" or ' + HAS_CLASS.format('c-byline__published')
+    + ' or ' + HAS_CLASS.format('publish-date') + ']',
+    '//meta[@property="article:published_time"]'
+)
+
+
+def extract_cnet_publish_date(tree):
     """Извлекает дату публикации CNET"""
-    date_selectors = [
-        'time[datetime]',
-        '[data-testid="publishDate"]',
-        '.c-byline__published',
-        '.publish-date',
-        'meta[property="article:published_time"]'
-    ]
-
-    for selector in date_selectors:
-        element = soup.select_one(selector)
-        if element:
-            if element.name == 'meta':
-                date_str = element.get('content', '')
-                return format_date(date_str)
-            datetime_attr = element.get('datetime', '')
-            if datetime_attr:
-                return format_date(datetime_attr)
-            return clean_text(element.text)
+    element = select_first(tree, _PUBLISH_DATE_XPATHS)
+    if element is not None:
+        if element.tag == 'meta':
+            return format_date(node_text(element))
+        datetime_attr = element.get('datetime', '')
+        if datetime_attr:
+            return format_date(datetime_attr)
+        return clean_text(element.text_content())
 
     return "Дата не указана"
 
 
-def extract_cnet_update_date(soup):
+_UPDATE_DATE_XPATHS = compile_xpaths(
+    '//*[@data-testid="updateDate" or ' + HAS_CLASS.format('c-byline__updated')
+    + ' or ' + HAS_CLASS.format('update-date') + ']'
+)
+
+
+def extract_cnet_update_date(tree):
     """Извлекает дату обновления статьи CNET"""
-    update_selectors = [
-        '[data-testid="updateDate"]',
-        '.c-byline__updated',
-        '.update-date'
-    ]
-
-    for selector in update_selectors:
-        element = soup.select_one(selector)
-        if element:
-            datetime_attr = element.get('datetime', '')
-            if datetime_attr:
-                return format_date(datetime_attr)
-            return clean_text(element.text)
+    element = select_first(tree, _UPDATE_DATE_XPATHS)
+    if element is not None:
+        datetime_attr = element.get('datetime', '')
+        if datetime_attr:
+            return format_date(datetime_attr)
+        return clean_text(element.text_content())
 
     return ""
 
 
-def extract_cnet_summary(soup):
+_SUMMARY_XPATHS = compile_xpaths(
+    '//*[@data-testid="dek" or ' + HAS_CLASS.format('c-pageArticle_dek')
+    + ' or ' + HAS_CLASS.format('article-dek') + ']',
+    '//meta[@property="og:description"]',
+    '//meta[@name="description"]'
+)
+
+
+def extract_cnet_summary(tree):
     """Извлекает краткое описание/саммари статьи CNET"""
-    summary_selectors = [
-        '[data-testid="dek"]',
-        '.c-pageArticle_dek',
-        '.article-dek',
-        'meta[property="og:description"]',
-        'meta[name="description"]'
-    ]
-
-    for selector in summary_selectors:
-        element = soup.select_one(selector)
-        if element:
-            if element.name == 'meta':
-                return clean_text(element.get('content', ''))
-            return clean_text(element.text)
+    element = select_first(tree, _SUMMARY_XPATHS)
+    if element is not None:
+        return clean_text(node_text(element))
 
     return ""
 
 
-def extract_cnet_tags(soup):
+_TAG_XPATHS = compile_xpaths(
+    '//*[@data-testid="tagList"]//a',
+    '//*[' + HAS_CLASS.format('c-tagList') + ']//a',
+    '//*[' + HAS_CLASS.format('tags') + ']//a',
+    '//*[' + HAS_CLASS.format('categories') + ']//a'
+)
+
+
+def extract_cnet_tags(tree):
     """Извлекает теги/категории CNET"""
     tags = []
-    tag_selectors = [
-        '[data-testid="tagList"] a',
-        '.c-tagList a',
-        '.tags a',
-        '.categories a'
-    ]
-
-    for selector in tag_selectors:
-        elements = soup.select(selector)
-        for element in elements:
-            tag_text = clean_text(element.text)
+
+    for tag_xpath in _TAG_XPATHS:
+        for element in tag_xpath(tree):
+            tag_text = clean_text(element.text_content())
             if tag_text:
                 tags.append(tag_text)
 
     return tags
 
 
-def extract_cnet_category(soup):
-    """Извлекает категорию статьи CNET"""
-    category_selectors = [
-        '[data-testid="breadcrumb"] a:last-child',
-        '.c-breadcrumbs a:last-child',
-        '.breadcrumb a:last-child'
-    ]
+# Последняя ссылка в хлебных крошках (аналог a:last-child)
+_CATEGORY_XPATHS = compile_xpaths(
+    '//*[@data-testid="breadcrumb" or ' + HAS_CLASS.format('c-breadcrumbs') + ' or '
+    + HAS_CLASS.format('breadcrumb') + ']//a[not(following-sibling::*)]'
+)
 
-    for selector in category_selectors:
-        element = soup.select_one(selector)
-        if element:
-            return clean_text(element.text)
+
+def extract_cnet_category(tree):
+    """Извлекает категорию статьи CNET"""
+    element = select_first(tree, _CATEGORY_XPATHS)
+    if element is not None:
+        return clean_text(element.text_content())
 
     return ""
 
 
-def extract_cnet_rating(soup):
-    """Извлекает рейтинг (если это обзор)"""
-    rating_selectors = [
-        '[data-testid="rating"]',
-        '.c-reviewScore',
-        '.rating'
-    ]
+_RATING_XPATHS = compile_xpaths(
+    '//*[@data-testid="rating" or ' + HAS_CLASS.format('c-reviewScore')
+    + ' or ' + HAS_CLASS.format('rating') + ']'
+)
 
-    for selector in rating_selectors:
-        element = soup.select_one(selector)
-        if element:
-            return clean_text(element.text)
+
+def extract_cnet_rating(tree):
+    """Извлекает рейтинг (если это обзор)"""
+    element = select_first(tree, _RATING_XPATHS)
+    if element is not None:
+        return clean_text(element.text_content())
 
     return ""
 
 
-def extract_cnet_images(soup):
+_IMAGE_XPATHS = compile_xpaths(
+    '//article//img',
+    '//*[' + HAS_CLASS.format('c-pageArticle_content') + ']//img',
+    '//*[contains(@data-testid, "image")]//img',
+    '//*[' + HAS_CLASS.format('c-figure') + ']//img'
+)
+# Домены, с которых принимаются изображения (вместе с поддоменами: www., sm., image. и т.д.)
+_IMAGE_DOMAINS = frozenset({'cnet.com', 'cnbcfm.com'})
+
+
+def extract_cnet_images(tree):
     """Извлекает изображения из статьи CNET"""
     images = []
-    img_selectors = [
-        'article img',
-        '.c-pageArticle_content img',
-        '[data-testid*="image"] img',
-        '.c-figure img'
-    ]
-
-    for selector in img_selectors:
-        img_elements = soup.select(selector)
-        for img in img_elements:
+
+    for image_xpath in _IMAGE_XPATHS:
+        for img in image_xpath(tree):
             src = img.get('src') or img.get('data-src')
-            if src and not src.startswith('data:') and any(domain in src for domain in ['cnet.com', 'cnbcfm.com']):
+            if src and not src.startswith('data:') and host_in_domains(src, _IMAGE_DOMAINS):
                 images.append({
                     'src': src,
                     'alt': img.get('alt', ''),
@@ -265,53 +258,24 @@ def extract_cnet_images(soup):
 def find_cnet_image_caption(img_element):
     """Находит подпись к изображению в CNET"""
     # Ищем в родительском элементе figure
-    parent = img_element.parent
-    if parent and parent.name == 'figure':
-        caption = parent.find('figcaption')
-        if caption:
-            return clean_text(caption.text)
+    parent = img_element.getparent()
+    if parent is not None and parent.tag == 'figure':
+        caption = parent.find('.//figcaption')
+        if caption is not None:
+            return clean_text(caption.text_content())
 
     # Ищем в соседних элементах
-    next_sibling = img_element.find_next_sibling('p')
-    if next_sibling and any(word in next_sibling.get('class', []) for word in ['caption', 'credit']):
-        return clean_text(next_sibling.text)
+    next_sibling = next(img_element.itersiblings('p'), None)
+    if next_sibling is not None and any(
+            word in next_sibling.get('class', '').split() for word in ['caption', 'credit']):
+        return clean_text(next_sibling.text_content())
 
     return ""
 
 
-def clean_text(text):
-    """Очищает текст от лишних пробелов и символов"""
-    if not text:
-        return ""
-
-    # Удаляем лишние пробелы и переносы
-    text = re.sub(r'\s+', ' ', text.strip())
-    # Удаляем непечатаемые символы
-    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
-
-    return text
-
-
-def format_date(date_str):
-    """Форматирует дату в читаемый вид"""
-    try:
-        # Пробуем разные форматы дат
-        for fmt in ['%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%d']:
-            try:
-                dt = datetime.strptime(date_str, fmt)
-                return dt.strftime('%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                continue
-        return date_str
-    except:
-        return date_str
-
-
-# Пример использования
-def fetch_text_cnet(url):
-
-    article = parse_cnet_article(url)
-
-    return article['content']
-
-
+def extract_text_cnet(html_bytes, parser):
+    """
+    Извлекает текст статьи из загруженной страницы (вызывается web_parser в пуле потоков).
+    Для пайплайна нужен только текст: метаданные не извлекаются.
+    """
+    return extract_cnet_content(parse_html(html_bytes, parser))
@@ -1,19 +1,19 @@
-from bs4 import BeautifulSoup
-import requests
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import Optional, Dict, Callable
 import logging
+from models import Article
 
-def parse_article_with_metadata(html_content):
+# Строим дерево только из нужных парсеру узлов (заголовок, meta и секции с текстом),
+# остальная разметка страницы (навигация, скрипты, реклама) пропускается при разборе
+_ARTICLE_ONLY = SoupStrainer(['h1', 'title', 'meta', 'section'])
+
+def parse_article_with_metadata(html_content, url=''):
     """
     Парсит статью с метаданными
     """
-    soup = BeautifulSoup(html_content, 'html.parser')
+    soup = BeautifulSoup(html_content, 'lxml', parse_only=_ARTICLE_ONLY)
 
-    result = {
-        'title': None,
-        'content': '',
-        'chapters': []
-    }
+    result = Article(url=url)
 
     # Пытаемся найти заголовок (может быть в разных местах)
     title = (soup.find('h1') or
@@ -22,9 +22,9 @@ def parse_article_with_metadata(html_content):
 
     if title:
         if hasattr(title, 'text'):
-            result['title'] = title.text.strip()
+            result.title = title.text.strip()
         elif hasattr(title, 'get'):
-            result['title'] = title.get('content', '').strip()
+            result.title = title.get('content', '').strip()
 
     # Парсим основной контент
     content_body = soup.find('section', id='content-body')
@@ -34,47 +34,23 @@ def parse_article_with_metadata(html_content):
             text = p.get_text(strip=True)
             if text and not text.startswith('@'):
                 paragraphs.append(text)
-        result['content'] = ' '.join(paragraphs)
+        result.content = ' '.join(paragraphs)
 
     # Парсим главы/разделы
     chapters = soup.find_all('section', class_='section main-article-chapter')
     for chapter in chapters:
         chapter_title = chapter.get('data-menu-title', '').strip()
         if chapter_title:
-            result['chapters'].append(chapter_title)
+            result.chapters.append(chapter_title)
 
     return result
 
 
-# Пример использования
-def parse_article_from_url(url):
+def extract_text_computerweekly(html_bytes, parser):
     """
-    Полная функция для парсинга статьи по URL
+    Извлекает текст статьи из загруженной страницы (вызывается web_parser в пуле потоков).
+    Разметка разбирается BeautifulSoup, поэтому lxml-парсер parser не используется.
     """
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        # Парсим статью
-        article_data = parse_article_with_metadata(response.text)
-
-        return article_data
-
-    except Exception as e:
-        print(f"Ошибка при парсинге: {e}")
-        return None
-
-
-
-
-
-# Пример использования
-def fetch_text_computerweekly(url) -> Optional[str]:
-
-
-    result = parse_article_from_url(url)
-    return result['content']
+    # Страница передается байтами: BeautifulSoup определяет кодировку по разметке
+    # и заменяет некорректные байты, а не падает на них
+    return parse_article_with_metadata(html_bytes).content
@@ -1,167 +1,155 @@
-import requests
-from bs4 import BeautifulSoup
-import re
-
-
-def parse_engadget_article(url):
-    """
-    Парсит статью с Engadget-подобного сайта
-    """
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-        }
-
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Извлекаем основные данные
-        article_data = {
-            'title': extract_title(soup),
-            'content': extract_content(soup),
-            'author': extract_author(soup),
-            'publish_date': extract_publish_date(soup),
-            'tags': extract_tags(soup),
-            'images': extract_images(soup),
-            'url': url
-        }
-
-        return article_data
-
-    except Exception as e:
-        print(f"Ошибка при парсинге статьи: {e}")
-        return None
-
-
-def extract_title(soup):
+import lxml.html
+from lxml import etree
+import io
+from models import Article
+from parsers._textutils import CLASS_CONTAINS, HAS_CLASS, clean_text, compile_xpaths, node_text, select_first
+from parsers._htmlparser import parse_html
+
+
+def parse_engadget_article_from_html(html, url):
+    """Извлекает данные статьи Engadget из уже загруженного HTML"""
+    # HTML разбирается один раз; все поля извлекаются из одного lxml-дерева
+    tree = lxml.html.fromstring(html)
+
+    # Извлекаем основные данные
+    return Article(
+        title=extract_title(tree),
+        content=extract_content(tree),
+        author=extract_author(tree),
+        publish_date=extract_publish_date(tree),
+        tags=extract_tags(tree),
+        images=extract_images(tree),
+        url=url
+    )
+
+
+# XPath-выражения перечислены по приоритету и компилируются один раз при импорте модуля.
+# Равнозначные варианты разметки одного поля объединены через "|" или "or"
+_TITLE_XPATHS = compile_xpaths(
+    '//h1',
+    '//*[@data-testid="article-title"] | //header//h1 | //*[' + HAS_CLASS.format('article-title') + ']',
+    '//title'
+)
+
+
+def extract_title(tree):
     """Извлекает заголовок статьи"""
     # Пробуем разные селекторы для заголовка
-    selectors = [
-        'h1',
-        '[data-testid="article-title"]',
-        'header h1',
-        '.article-title',
-        'title'
-    ]
-
-    for selector in selectors:
-        element = soup.select_one(selector)
-        if element and element.text.strip():
-            return element.text.strip()
+    for title_xpath in _TITLE_XPATHS:
+        found = title_xpath(tree)
+        if found and found[0].text_content().strip():
+            return found[0].text_content().strip()
 
     return "Заголовок не найден"
 
 
-def extract_content(soup):
-    """Извлекает основной контент статьи"""
-    # Ищем основной контент по различным селекторам
-    content_selectors = [
-        '[data-article-body="true"]',
-        '.article-content',
-        '.post-content',
-        '.entry-content',
-        '[class*="body"]',
-        '[class*="content"]',
-        'article'
-    ]
-
-    content_text = []
-
-    for selector in content_selectors:
-        content_element = soup.select_one(selector)
-        if content_element:
+# XPath-аналоги селекторов тела статьи: компилируются один раз и выполняются в libxml2
+_CONTENT_XPATHS = tuple(etree.XPath(expr) for expr in (
+    '//*[@data-article-body="true"]',
+    '//*[' + HAS_CLASS.format('article-content') + ']',
+    '//*[' + HAS_CLASS.format('post-content') + ']',
+    '//*[' + HAS_CLASS.format('entry-content') + ']',
+    '//*[contains(@class, "body")]',
+    '//*[contains(@class, "content")]',
+    '//article'
+))
+_PARAGRAPHS_XPATH = etree.XPath('.//p[not(@class="ad-wrapper")] | .//div[not(@class="ad-wrapper")]')
+
+
+def extract_content(tree):
+    """Извлекает основной контент статьи из lxml-дерева"""
+    # Ищем основной контент по различным селекторам; абзацы пишутся сразу в буфер
+    content_text = io.StringIO()
+    has_text = False
+
+    for content_xpath in _CONTENT_XPATHS:
+        found = content_xpath(tree)
+        if found:
             # Извлекаем текст из всех параграфов
-            paragraphs = content_element.find_all(['p', 'div'], class_=lambda x: x != 'ad-wrapper')
-
-            for p in paragraphs:
-                text = clean_text(p.get_text())
+            for p in _PARAGRAPHS_XPATH(found[0]):
+                text = clean_text(p.text_content())
                 if text and len(text) > 20:  # Игнорируем короткие тексты
-                    content_text.append(text)
+                    if has_text:
+                        content_text.write('\n\n')
+                    content_text.write(text)
+                    has_text = True
 
-            if content_text:
+            if has_text:
                 break
 
-    return '\n\n'.join(content_text) if content_text else "Контент не найден"
+    return content_text.getvalue() if has_text else "Контент не найден"
+
 
+_AUTHOR_XPATHS = compile_xpaths(
+    '//*[@data-testid="author-name" or ' + HAS_CLASS.format('author-name') + ']'
+    ' | //*[' + HAS_CLASS.format('byline') + ']//a',
+    '//*[@rel="author"]',
+    '//meta[@name="author"]'
+)
 
-def extract_author(soup):
+
+def extract_author(tree):
     """Извлекает автора статьи"""
-    author_selectors = [
-        '[data-testid="author-name"]',
-        '.author-name',
-        '.byline a',
-        '[rel="author"]',
-        'meta[name="author"]'
-    ]
-
-    for selector in author_selectors:
-        element = soup.select_one(selector)
-        if element:
-            if element.name == 'meta':
-                return element.get('content', '').strip()
-            return element.text.strip()
+    element = select_first(tree, _AUTHOR_XPATHS)
+    if element is not None:
+        return node_text(element).strip()
 
     return "Автор не указан"
 
 
-def extract_publish_date(soup):
+_PUBLISH_DATE_XPATHS = compile_xpaths(
+    '//time[@datetime]',
+    '//*[' + HAS_CLASS.format('publish-date') + ' or ' + HAS_CLASS.format('date-published') + ']',
+    '//meta[@property="article:published_time"]',
+    '//*[@data-testid="published-date"]'
+)
+
+
+def extract_publish_date(tree):
     """Извлекает дату публикации"""
-    date_selectors = [
-        'time[datetime]',
-        '.publish-date',
-        '.date-published',
-        'meta[property="article:published_time"]',
-        '[data-testid="published-date"]'
-    ]
-
-    for selector in date_selectors:
-        element = soup.select_one(selector)
-        if element:
-            if element.name == 'meta':
-                return element.get('content', '').strip()
-            return element.get('datetime', element.text).strip()
+    element = select_first(tree, _PUBLISH_DATE_XPATHS)
+    if element is not None:
+        if element.tag == 'meta':
+            return node_text(element).strip()
+        return element.get('datetime', element.text_content()).strip()
 
     return "Дата не указана"
 
 
-def extract_tags(soup):
+_TAG_XPATHS = compile_xpaths(
+    '//*[' + HAS_CLASS.format('tags') + ']//a',
+    '//*[' + HAS_CLASS.format('categories') + ']//a',
+    '//*[@rel="tag"]',
+    '//*[' + HAS_CLASS.format('topic-tags') + ']//a'
+)
+
+
+def extract_tags(tree):
     """Извлекает теги/категории"""
     tags = []
-    tag_selectors = [
-        '.tags a',
-        '.categories a',
-        '[rel="tag"]',
-        '.topic-tags a'
-    ]
-
-    for selector in tag_selectors:
-        elements = soup.select(selector)
-        for element in elements:
-            tag_text = clean_text(element.text)
+
+    for tag_xpath in _TAG_XPATHS:
+        for element in tag_xpath(tree):
+            tag_text = clean_text(element.text_content())
             if tag_text:
                 tags.append(tag_text)
 
     return tags
 
 
-def extract_images(soup):
+_IMAGE_XPATHS = compile_xpaths(
+    '//article//img',
+    '//*[' + HAS_CLASS.format('article-content') + ']//img',
+    '//*[' + HAS_CLASS.format('post-content') + ']//img'
+)
+
+
+def extract_images(tree):
     """Извлекает изображения из статьи"""
     images = []
-    img_selectors = [
-        'article img',
-        '.article-content img',
-        '.post-content img'
-    ]
-
-    for selector in img_selectors:
-        img_elements = soup.select(selector)
-        for img in img_elements:
+
+    for image_xpath in _IMAGE_XPATHS:
+        for img in image_xpath(tree):
             src = img.get('src') or img.get('data-src')
             if src and not src.startswith('data:'):
                 images.append({
@@ -173,32 +161,25 @@ def extract_images(soup):
     return images
 
 
+# Подпись ищется среди потомков родителя по подстроке в классе (без учета регистра)
+_CAPTION_XPATH = etree.XPath(
+    '../descendant::*[self::figcaption or self::p or self::div][' + CLASS_CONTAINS.format('caption') + ']'
+)
+
+
 def find_image_caption(img_element):
     """Находит подпись к изображению"""
     # Ищем в соседних элементах
-    parent = img_element.parent
-    if parent:
-        caption = parent.find(['figcaption', 'p', 'div'], class_=lambda x: x and 'caption' in x.lower())
-        if caption:
-            return clean_text(caption.text)
+    found = _CAPTION_XPATH(img_element)
+    if found:
+        return clean_text(found[0].text_content())
 
     return ""
 
 
-def clean_text(text):
-    """Очищает текст от лишних пробелов и символов"""
-    if not text:
-        return ""
-
-    # Удаляем лишние пробелы и переносы
-    text = re.sub(r'\s+', ' ', text.strip())
-    # Удаляем непечатаемые символы
-    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
-
-    return text
-
-
-# Пример использования
-def fetch_text_engadget(url):
-    article = parse_engadget_article(url)
-    return article['content']
\ No newline at end of file
+def extract_text_engadget(html_bytes, parser):
+    """
+    Извлекает текст статьи из загруженной страницы (вызывается web_parser в пуле потоков).
+    Для пайплайна нужен только текст: метаданные не извлекаются.
+    """
+    return extract_content(parse_html(html_bytes, parser))
@@ -1,194 +1,185 @@
-import requests
-from bs4 import BeautifulSoup
-import re
-from datetime import datetime
-
-
-def parse_wired_article(url):
-    """
-    Парсит статью с Wired.com
-    """
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-        }
-
-        print(f"Загружаем статью: {url}")
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Извлекаем основные данные
-        article_data = {
-            'title': extract_wired_title(soup),
-            'content': extract_wired_content(soup),
-            'author': extract_wired_author(soup),
-            'publish_date': extract_wired_publish_date(soup),
-            'summary': extract_wired_summary(soup),
-            'tags': extract_wired_tags(soup),
-            'images': extract_wired_images(soup),
-            'url': url
-        }
-
-        return article_data
-
-    except Exception as e:
-        print(f"Ошибка при парсинге статьи: {e}")
-        return None
-
-
-def extract_wired_title(soup):
+import lxml.html
+from lxml import etree
+import io
+from models import Article
+from parsers._textutils import (CLASS_CONTAINS, HAS_CLASS, clean_text, compile_xpaths, format_date,
+                                host_in_domains, node_text, select_first)
+from parsers._htmlparser import parse_html
+
+
+def parse_wired_article_from_html(html, url):
+    """Извлекает данные статьи Wired из уже загруженного HTML"""
+    # HTML разбирается один раз; все поля извлекаются из одного lxml-дерева
+    tree = lxml.html.fromstring(html)
+
+    # Извлекаем основные данные
+    return Article(
+        title=extract_wired_title(tree),
+        content=extract_wired_content(tree),
+        author=extract_wired_author(tree),
+        publish_date=extract_wired_publish_date(tree),
+        summary=extract_wired_summary(tree),
+        tags=extract_wired_tags(tree),
+        images=extract_wired_images(tree),
+        url=url
+    )
+
+
+# XPath-выражения перечислены по приоритету и компилируются один раз при импорте модуля.
+# Равнозначные варианты разметки одного поля объединены через "|" или "or"
+_TITLE_XPATHS = compile_xpaths(
+    '//h1[@data-testid="ContentHeaderHed" or ' + HAS_CLASS.format('headline')
+    + ' or ' + HAS_CLASS.format('article-title') + ']',
+    '//h1',
+    '//title'
+)
+
+
+def extract_wired_title(tree):
     """Извлекает заголовок статьи Wired"""
-    selectors = [
-        'h1[data-testid="ContentHeaderHed"]',
-        'h1.headline',
-        'h1.article-title',
-        'h1',
-        'title'
-    ]
-
-    for selector in selectors:
-        element = soup.select_one(selector)
-        if element and element.text.strip():
-            return clean_text(element.text.strip())
+    for title_xpath in _TITLE_XPATHS:
+        found = title_xpath(tree)
+        if found and found[0].text_content().strip():
+            return clean_text(found[0].text_content().strip())
 
     return "Заголовок не найден"
 
 
-def extract_wired_content(soup):
-    """Извлекает основной контент статьи Wired"""
-    content_selectors = [
-        'div[data-testid="ContentHeaderAccreditation"] + div',  # Контент после заголовка
-        'article div.body__inner-container',
-        '.article-body',
-        '.post-content',
-        '[data-attribute-verso-pattern="article-body"]'
-    ]
-
-    content_text = []
-
-    for selector in content_selectors:
-        content_element = soup.select_one(selector)
-        if content_element:
-            # Извлекаем текст из всех параграфов
-            paragraphs = content_element.find_all(['p', 'h2', 'h3'], recursive=True)
-
-            for element in paragraphs:
-                # Пропускаем рекламу и ненужные элементы
-                if element.find_parents(['aside', 'div.ad-wrapper', 'figure']):
-                    continue
-
-                text = clean_text(element.get_text())
+# XPath-аналоги селекторов тела статьи: компилируются один раз и выполняются в libxml2
+_CONTENT_XPATHS = tuple(etree.XPath(expr) for expr in (
+    '//div[@data-testid="ContentHeaderAccreditation"]/following-sibling::*[1][self::div]',  # Контент после заголовка
+    '//article//div[' + HAS_CLASS.format('body__inner-container') + ']',
+    '//*[' + HAS_CLASS.format('article-body') + ']',
+    '//*[' + HAS_CLASS.format('post-content') + ']',
+    '//*[@data-attribute-verso-pattern="article-body"]'
+))
+# Параграфы и подзаголовки за один проход; текст внутри рекламы и подписей к медиа
+# отсекается предикатом прямо в libxml2, без обхода родителей из Python
+_PARAGRAPHS_XPATH = etree.XPath(
+    './/*[self::p or self::h2 or self::h3]'
+    '[not(ancestor::aside or ancestor::figure or ancestor::div[' + HAS_CLASS.format('ad-wrapper') + '])]'
+)
+
+
+def extract_wired_content(tree):
+    """Извлекает основной контент статьи Wired из lxml-дерева"""
+    # Абзацы пишутся сразу в буфер, без промежуточного списка
+    content_text = io.StringIO()
+    has_text = False
+
+    for content_xpath in _CONTENT_XPATHS:
+        found = content_xpath(tree)
+        if found:
+            # Извлекаем текст из всех параграфов (реклама уже отфильтрована XPath)
+            for element in _PARAGRAPHS_XPATH(found[0]):
+                text = clean_text(element.text_content())
                 if text and len(text) > 10:  # Игнорируем короткие тексты
-                    content_text.append(text)
+                    if has_text:
+                        content_text.write('\n\n')
+                    content_text.write(text)
+                    has_text = True
 
-            if content_text:
+            # Первый контейнер с текстом найден - остальные селекторы не проверяем
+            if has_text:
                 break
 
-    return '\n\n'.join(content_text) if content_text else "Контент не найден"
+    return content_text.getvalue() if has_text else "Контент не найден"
+
 
+_AUTHOR_XPATHS = compile_xpaths(
+    '//a[@data-testid="AuthorBioLink"] | //*[' + HAS_CLASS.format('byline-component__content') + ']//a'
+    ' | //*[' + HAS_CLASS.format('author-name') + ']',
+    '//meta[@name="author"]',
+    '//*[@rel="author"]'
+)
 
-def extract_wired_author(soup):
+
+def extract_wired_author(tree):
     """Извлекает автора статьи Wired"""
-    author_selectors = [
-        'a[data-testid="AuthorBioLink"]',
-        '.byline-component__content a',
-        '.author-name',
-        'meta[name="author"]',
-        '[rel="author"]'
-    ]
-
-    for selector in author_selectors:
-        element = soup.select_one(selector)
-        if element:
-            if element.name == 'meta':
-                return clean_text(element.get('content', ''))
-            return clean_text(element.text)
+    element = select_first(tree, _AUTHOR_XPATHS)
+    if element is not None:
+        return clean_text(node_text(element))
 
     return "Автор не указан"
 
 
-def extract_wired_publish_date(soup):
+_PUBLISH_DATE_XPATHS = compile_xpaths(
+    '//time[@datetime]',
+    '//*[@data-testid="ContentHeaderPublishDate" or ' + HAS_CLASS.format('publish-date') + ']',
+    '//meta[@property="article:published_time"]'
+)
+
+
+def extract_wired_publish_date(tree):
     """Извлекает дату публикации Wired"""
-    date_selectors = [
-        'time[datetime]',
-        '[data-testid="ContentHeaderPublishDate"]',
-        '.publish-date',
-        'meta[property="article:published_time"]'
-    ]
-
-    for selector in date_selectors:
-        element = soup.select_one(selector)
-        if element:
-            if element.name == 'meta':
-                date_str = element.get('content', '')
-                return format_date(date_str)
-            datetime_attr = element.get('datetime', '')
-            if datetime_attr:
-                return format_date(datetime_attr)
-            return clean_text(element.text)
+    element = select_first(tree, _PUBLISH_DATE_XPATHS)
+    if element is not None:
+        if element.tag == 'meta':
+            return format_date(node_text(element))
+        datetime_attr = element.get('datetime', '')
+        if datetime_attr:
+            return format_date(datetime_attr)
+        return clean_text(element.text_content())
 
     return "Дата не указана"
 
 
-def extract_wired_summary(soup):
+_SUMMARY_XPATHS = compile_xpaths(
+    '//*[@data-testid="ContentHeaderDek" or ' + HAS_CLASS.format('article-summary')
+    + ' or ' + HAS_CLASS.format('dek') + ']',
+    '//meta[@property="og:description"]'
+)
+
+
+def extract_wired_summary(tree):
     """Извлекает краткое описание/саммари статьи"""
-    summary_selectors = [
-        '[data-testid="ContentHeaderDek"]',
-        '.article-summary',
-        '.dek',
-        'meta[property="og:description"]'
-    ]
-
-    for selector in summary_selectors:
-        element = soup.select_one(selector)
-        if element:
-            if element.name == 'meta':
-                return clean_text(element.get('content', ''))
-            return clean_text(element.text)
+    element = select_first(tree, _SUMMARY_XPATHS)
+    if element is not None:
+        return clean_text(node_text(element))
 
     return ""
 
 
-def extract_wired_tags(soup):
+_TAG_XPATHS = compile_xpaths(
+    '//*[@data-testid="TopicTags"]//a',
+    '//*[' + HAS_CLASS.format('tags') + ']//a',
+    '//*[' + HAS_CLASS.format('categories') + ']//a',
+    '//*[' + HAS_CLASS.format('topic-list') + ']//a'
+)
+
+
+def extract_wired_tags(tree):
     """Извлекает теги/категории Wired"""
     tags = []
-    tag_selectors = [
-        '[data-testid="TopicTags"] a',
-        '.tags a',
-        '.categories a',
-        '.topic-list a'
-    ]
-
-    for selector in tag_selectors:
-        elements = soup.select(selector)
-        for element in elements:
-            tag_text = clean_text(element.text)
+
+    for tag_xpath in _TAG_XPATHS:
+        for element in tag_xpath(tree):
+            tag_text = clean_text(element.text_content())
             if tag_text:
                 tags.append(tag_text)
 
     return tags
 
 
-def extract_wired_images(soup):
+_IMAGE_XPATHS = compile_xpaths(
+    '//article//img',
+    '//*[' + HAS_CLASS.format('body__inner-container') + ']//img',
+    '//*[contains(@data-testid, "Image")]//img'
+)
+
+
+# Домены, с которых принимаются изображения (вместе с поддоменами: www., media. и т.д.)
+_IMAGE_DOMAINS = frozenset({'wired.com'})
+
+
+def extract_wired_images(tree):
     """Извлекает изображения из статьи Wired"""
     images = []
-    img_selectors = [
-        'article img',
-        '.body__inner-container img',
-        '[data-testid*="Image"] img'
-    ]
-
-    for selector in img_selectors:
-        img_elements = soup.select(selector)
-        for img in img_elements:
+
+    for image_xpath in _IMAGE_XPATHS:
+        for img in image_xpath(tree):
             src = img.get('src') or img.get('data-src')
-            if src and not src.startswith('data:') and 'wired.com' in src:
+            if src and not src.startswith('data:') and host_in_domains(src, _IMAGE_DOMAINS):
                 images.append({
                     'src': src,
                     'alt': img.get('alt', ''),
@@ -198,50 +189,26 @@ def extract_wired_images(soup):
     return images
 
 
+# Подпись ищется среди потомков родителя по подстроке в классе (без учета регистра)
+_CAPTION_XPATH = etree.XPath(
+    '../descendant::*[self::figcaption or self::p or self::div]['
+    + ' or '.join(CLASS_CONTAINS.format(word) for word in ('caption', 'credit', 'description')) + ']'
+)
+
+
 def find_image_caption(img_element):
     """Находит подпись к изображению"""
     # Ищем в родительском элементе или соседях
-    parent = img_element.parent
-    if parent:
-        caption = parent.find(['figcaption', 'p', 'div'], class_=lambda x: x and any(
-            word in str(x).lower() for word in ['caption', 'credit', 'description']))
-        if caption:
-            return clean_text(caption.text)
+    found = _CAPTION_XPATH(img_element)
+    if found:
+        return clean_text(found[0].text_content())
 
     return ""
 
 
-def clean_text(text):
-    """Очищает текст от лишних пробелов и символов"""
-    if not text:
-        return ""
-
-    # Удаляем лишние пробелы и переносы
-    text = re.sub(r'\s+', ' ', text.strip())
-    # Удаляем непечатаемые символы
-    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
-
-    return text
-
-
-def format_date(date_str):
-    """Форматирует дату в читаемый вид"""
-    try:
-        # Пробуем разные форматы дат
-        for fmt in ['%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%d']:
-            try:
-                dt = datetime.strptime(date_str, fmt)
-                return dt.strftime('%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                continue
-        return date_str
-    except:
-        return date_str
-
-
-# Пример использования
-def fetch_text_wired(url):
-
-    article = parse_wired_article(url)
-
-    return article['content']
\ No newline at end of file
+def extract_text_wired(html_bytes, parser):
+    """
+    Извлекает текст статьи из загруженной страницы (вызывается web_parser в пуле потоков).
+    Для пайплайна нужен только текст: метаданные не извлекаются.
+    """
+    return extract_wired_content(parse_html(html_bytes, parser))
@@ -1,28 +1,25 @@
 # publisher.py
 import asyncio
+import collections
 import sqlite3
 import random
+import re
 import logging
+from db import close_async_connections, get_async_connection, title_hash
 from aiogram import Bot, types
 from aiogram.exceptions import TelegramAPIError
 from dotenv import load_dotenv
 import os
-import datetime
+import time
 
 def get_sleep_duration():
     """Рассчитывает сколько секунд спать до 7 утра"""
-    now = datetime.datetime.now()
+    # Один вызов localtime вместо нескольких объектов datetime на каждом цикле
+    now = time.localtime()
 
-    # Если сейчас ночное время
-    if datetime.time(2, 0) <= now.time() < datetime.time(7, 0):
-        # Создаем datetime на 7:00 сегодня
-        wakeup_time = now.replace(hour=7, minute=0, second=0, microsecond=0)
-        # Если уже прошло 7:00, берем 7:00 следующего дня
-        if now >= wakeup_time:
-            wakeup_time += datetime.timedelta(days=1)
-
-        sleep_seconds = (wakeup_time - now).total_seconds()
-        return sleep_seconds
+    # Если сейчас ночное время, спим до 7:00 сегодняшнего дня
+    if NIGHT_START_HOUR <= now.tm_hour < NIGHT_END_HOUR:
+        return (NIGHT_END_HOUR - now.tm_hour) * 3600 - now.tm_min * 60 - now.tm_sec
 
     return 0  # Не ночное время
 # --- НАСТРОЙКИ ---
@@ -34,56 +31,80 @@ CHANNEL_ID = os.getenv('CHANNEL_ID')
 if not BOT_TOKEN or not CHANNEL_ID:
     raise ValueError("TELEGRAM_BOT_TOKEN и/или TELEGRAM_CHANNEL_ID не установлены.")
 
+# Ночной перерыв публикаций: с NIGHT_START_HOUR до NIGHT_END_HOUR часов
+NIGHT_START_HOUR = 2
+NIGHT_END_HOUR = 7
 # Интервал публикации в минутах
 PUBLISH_INTERVAL_MIN = 10
 PUBLISH_INTERVAL_MAX = 20
+# Сколько обработанных новостей загружается из БД за один запрос
+PUBLISH_BUFFER_SIZE = 50
+# Эмодзи, одно из которых случайно ставится перед заголовком сообщения
+EMOJI = ('📰', '📄', '♨️', '‼️', '⭐', '⚡', '💥', '🧨', '🎉', '🌟', '✨', '📨', '❗')
+# Ограничение длины сообщения Telegram (4096 символов для текста), оставляем запас
+MAX_TELEGRAM_MESSAGE_LENGTH = 4000
+
+# Тексты, с которыми новость не публикуется: запрещена реклама vpn сервисов,
+# а вторая фраза - типовой ответ Yandex GPT, когда он отказывается обрабатывать текст
+FORBIDDEN_RE = re.compile(
+    r'(?i)(?P<vpn>vpn)|(?P<gpt_error>В интернете есть много сайтов с информацией на эту тему\.)'
+)
+
+# Загруженные, но еще не опубликованные новости (строки SQL_SELECT_PROCESSED_BATCH)
+PUBLISH_BUFFER = collections.deque()
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# --- SQL-ЗАПРОСЫ ---
+# Новости выбираются пачкой по частичному индексу idx_news_processed и перемешиваются в памяти:
+# один запрос на PUBLISH_BUFFER_SIZE публикаций вместо запросов на каждой публикации.
+# Берутся самые свежие новости (ORDER BY id DESC тоже обслуживается индексом), иначе свежие
+# ждали бы, пока опубликуется весь накопленный старый запас
+SQL_SELECT_PROCESSED_BATCH = (
+    "SELECT title, title_ru, processed_full_text, link, source FROM news "
+    "WHERE published = 'processed' ORDER BY id DESC LIMIT ?"
+)
+SQL_MARK_PUBLISHED = "UPDATE news SET published = 'published_to_tg' WHERE title_hash = ?"
+
 # --- ФУНКЦИИ РАБОТЫ С БД ---
-def get_next_processed_news(db_name: str) -> dict | None:
+async def get_next_processed_news(db_name: str) -> dict | None:
     """
-    Получает следующую новость со статусом 'processed' из БД.
+    Получает следующую новость со статусом 'processed'.
+    Новости берутся из буфера PUBLISH_BUFFER, который пополняется из БД, когда опустеет.
     """
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    try:
-        # Выбираем новость со статусом 'processed'
-        cursor.execute(
-            "SELECT title, title_ru, processed_full_text, link, source FROM news WHERE published = 'processed' ORDER BY RANDOM() LIMIT 1"
-        )
-        row = cursor.fetchone()
-        if row:
-            return {
-                'title': row[0],
-                'title_ru': row[1],
-                'processed_full_text': row[2],
-                'link': row[3],
-                'source': row[4]
-
-            }
-        else:
+    if not PUBLISH_BUFFER:
+        try:
+            db = await get_async_connection(db_name)
+            async with db.execute(SQL_SELECT_PROCESSED_BATCH, (PUBLISH_BUFFER_SIZE,)) as cursor:
+                rows = await cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка БД при получении новости: {e}")
             return None
-    except sqlite3.Error as e:
-        logger.error(f"Ошибка БД при получении новости: {e}")
-        return None
-    finally:
-        conn.close()
+        # Публикуем новости пачки в случайном порядке
+        random.shuffle(rows)
+        PUBLISH_BUFFER.extend(rows)
 
-def mark_news_as_published(db_name: str, title: str) -> bool:
+    if not PUBLISH_BUFFER:
+        return None
+    row = PUBLISH_BUFFER.popleft()
+    return {
+        'title': row[0],
+        'title_ru': row[1],
+        'processed_full_text': row[2],
+        'link': row[3],
+        'source': row[4]
+    }
+
+async def mark_news_as_published(db_name: str, title: str) -> bool:
     """
     Обновляет статус новости на 'published_to_tg'.
     """
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    db = await get_async_connection(db_name)
     try:
-        cursor.execute(
-            "UPDATE news SET published = 'published_to_tg' WHERE title = ?",
-            (title,)
-        )
-        conn.commit()
+        cursor = await db.execute(SQL_MARK_PUBLISHED, (title_hash(title),))
+        await db.commit()
         success = cursor.rowcount > 0
         if success:
             logger.info(f"Новость '{title[:50]}...' помечена как опубликованная в Telegram.")
@@ -92,57 +113,60 @@ def mark_news_as_published(db_name: str, title: str) -> bool:
         return success
     except sqlite3.Error as e:
         logger.error(f"Ошибка БД при обновлении статуса новости '{title[:50]}...': {e}")
-        conn.rollback()
+        await db.rollback()
         return False
-    finally:
-        conn.close()
+
+async def published_writer(published: asyncio.Queue):
+    """
+    Единственный писатель статусов публикации: помечает новости из очереди как опубликованные.
+    Цикл публикации не ждет фиксации транзакции. Очередь завершается значением None.
+    """
+    while (title := await published.get()) is not None:
+        await mark_news_as_published(DB_NAME, title)
 
 # --- ФУНКЦИЯ ПУБЛИКАЦИИ В TELEGRAM ---
-async def publish_news_to_telegram(bot: Bot, news_item: dict):
+async def publish_news_to_telegram(bot: Bot, news_item: dict, published: asyncio.Queue):
     """
     Публикует новость в Telegram-канал.
+    Заголовок обработанной новости передается в очередь published для обновления статуса в БД.
     """
     try:
         title_ru = news_item['title_ru']
         source = news_item['source']
         processed_text = news_item['processed_full_text']
         link = news_item['link']
-        emozi = ['📰', '📄', '♨️', '‼️', '⭐', '⚡', '💥', '🧨', '🎉', '🌟', '✨', '📨', '❗']
 
         if not title_ru or not processed_text:
             logger.warning(f"Новость '{news_item['title'][:50]}...' не содержит переведенного заголовка или текста. Пропуск публикации.")
             # Все равно помечаем как опубликованную, чтобы не зацикливалось
-            mark_news_as_published(DB_NAME, news_item['title'])
-            return
-        if 'vpn' in processed_text.lower(): # запрещена реклама vpn сервисов
-            logger.info(f"Пропущена публикация: обнаружено слово 'vpn' в тексте новости '{news_item['title'][:50]}...'")
-            mark_news_as_published(DB_NAME, news_item['title'])
+            published.put_nowait(news_item['title'])
             return
-        if 'В интернете есть много сайтов с информацией на эту тему.' in processed_text:
-            logger.info(f"Пропущена публикация: ошибка обработки gpt новости '{news_item['title'][:50]}...'")
-            mark_news_as_published(DB_NAME, news_item['title'])
+        # Один проход по тексту без копии в нижнем регистре
+        forbidden = FORBIDDEN_RE.search(processed_text)
+        if forbidden:
+            if forbidden.lastgroup == 'vpn':
+                logger.info(f"Пропущена публикация: обнаружено слово 'vpn' в тексте новости '{news_item['title'][:50]}...'")
+            else:
+                logger.info(f"Пропущена публикация: ошибка обработки gpt новости '{news_item['title'][:50]}...'")
+            published.put_nowait(news_item['title'])
             return
 
         # Формируем текст сообщения
-        # Используем HTML для форматирования
-        message_text = f"{random.choice(emozi)}<b>{source}: {title_ru}</b>\n\n{processed_text}\n\n🔗 <a href='{link}'>Читать оригинал новости в источнике 👇</a>"
-
-        # Ограничение длины сообщения Telegram (4096 символов для текста)
-        # Если превышает, можно обрезать или отправить как документ/статью (не реализовано здесь)
-        MAX_TELEGRAM_MESSAGE_LENGTH = 4000 # Оставляем запас
-        if len(message_text) > MAX_TELEGRAM_MESSAGE_LENGTH:
-            logger.warning(f"Текст новости '{title_ru[:30]}...' слишком длинный ({len(message_text)} символов). Обрезаем.")
-            # Обрезаем текст, оставляя место для заголовка, ссылки и ...
-            # Простая логика обрезки
-            available_text_length = MAX_TELEGRAM_MESSAGE_LENGTH - len(f"<b>{title_ru}</b>\n\n...\n\n🔗 <a href='{link}'>Читать оригинал</a>")
-            if available_text_length > 100:
-                processed_text_trimmed = processed_text[:available_text_length - 3] + "..."
-                message_text = f"<b>{title_ru}</b>\n\n{processed_text_trimmed}\n\n🔗 <a href='{link}'>Читать оригинал</a>"
-            else:
-                 # Если совсем мало места, отправляем только заголовок и ссылку
-                 message_text = f"<b>{title_ru}</b>\n\n🔗 <a href='{link}'>Читать оригинал</a>"
-                 logger.warning("Очень короткий доступный лимит, отправляем только заголовок и ссылку.")
-
+        # Используем HTML для форматирования. Заголовок и ссылка считаются один раз,
+        # а текст новости сразу обрезается под оставшийся лимит - сообщение собирается один раз
+        header = f"{random.choice(EMOJI)}<b>{source}: {title_ru}</b>\n\n"
+        footer = f"\n\n🔗 <a href='{link}'>Читать оригинал новости в источнике 👇</a>"
+        text_budget = MAX_TELEGRAM_MESSAGE_LENGTH - len(header) - len(footer)
+
+        if len(processed_text) <= text_budget:
+            message_text = f"{header}{processed_text}{footer}"
+        elif text_budget > 100:
+            logger.warning(f"Текст новости '{title_ru[:30]}...' слишком длинный ({len(processed_text)} символов). Обрезаем.")
+            message_text = f"{header}{processed_text[:text_budget - 3]}...{footer}"
+        else:
+            # Если совсем мало места, отправляем только заголовок и ссылку
+            message_text = f"{header.rstrip()}{footer}"
+            logger.warning("Очень короткий доступный лимит, отправляем только заголовок и ссылку.")
 
         # Отправляем сообщение
         await bot.send_message(
@@ -153,8 +177,8 @@ async def publish_news_to_telegram(bot: Bot, news_item: dict):
         )
         logger.info(f"Новость '{title_ru[:50]}...' успешно опубликована в Telegram.")
 
-        # Обновляем статус в БД
-        mark_news_as_published(DB_NAME, news_item['title'])
+        # Обновляем статус в БД (в фоне, через писателя статусов)
+        published.put_nowait(news_item['title'])
 
     except TelegramAPIError as e:
         logger.error(f"Ошибка Telegram API при публикации новости '{news_item['title_ru'][:50]}...': {e}")
@@ -173,20 +197,22 @@ async def run_publisher():
 
     logger.info("=== Запуск Telegram Publisher ===")
     bot = Bot(token=BOT_TOKEN)
+    published = asyncio.Queue()
+    writer = asyncio.create_task(published_writer(published))
 
     try:
         while True:
             sleep_duration = get_sleep_duration()
             if sleep_duration > 0:
                 logger.info(f'🌙 Ночной перерыв. Ожидание до утра: {sleep_duration / 3600:.1f} часов')
+                # Засыпаем один раз до конца перерыва, без повторных проверок
                 await asyncio.sleep(sleep_duration)
-                continue
             # 1. Получаем следующую обработанную новость
-            news_item = get_next_processed_news(DB_NAME)
+            news_item = await get_next_processed_news(DB_NAME)
 
             if news_item:
                 # 2. Если новость найдена, публикуем её
-                await publish_news_to_telegram(bot, news_item)
+                await publish_news_to_telegram(bot, news_item, published)
             else:
                 logger.info("Нет новых обработанных новостей для публикации.")
 
@@ -204,6 +230,10 @@ async def run_publisher():
         logger.critical(f"Критическая ошибка в основном цикле publisher: {e}", exc_info=True)
     finally:
         await bot.session.close()
+        # Дожидаемся записи оставшихся статусов
+        await published.put(None)
+        await writer
+        await close_async_connections()
         logger.info("=== Telegram Publisher остановлен ===")
 
 # --- ЗАПУСК ---
@@ -1,11 +1,12 @@
-import requests
-from bs4 import BeautifulSoup
+import httpx
+from lxml import etree
 from typing import List, Dict, Any, Callable, Optional
-import time
-import random
 import sqlite3
 import asyncio
+import io
 import logging
+from db import get_connection, title_hash
+from http_client import HostRateLimiter, get_client
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -19,68 +20,136 @@ RSS_FEEDS = {
 }
 # Имя файла базы данных
 DB_NAME = 'news.db'
+REQUEST_TIMEOUT = 15
+# Сколько лент загружается одновременно
+CONCURRENT_FEEDS = 4
+# Добавим User-Agent, чтобы избежать блокировок
+RSS_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# --- SQL-ЗАПРОСЫ ---
+# Дубликаты отсекаются по хэшу заголовка (16 байт) вместо самого заголовка: индекс меньше,
+# а сравнения ключей при вставке и обновлении дешевле
+SQL_CREATE_NEWS = '''
+    CREATE TABLE IF NOT EXISTS news (
+        id INTEGER PRIMARY KEY,
+        title_hash BLOB NOT NULL UNIQUE,
+        title TEXT NOT NULL,
+        link TEXT NOT NULL,
+        thumbnail_url TEXT,
+        source TEXT NOT NULL,
+        published TEXT NOT NULL DEFAULT 'no'
+    )
+'''
+# Индекс по статусу: все этапы выбирают новости по published
+SQL_CREATE_PUBLISHED_INDEX = "CREATE INDEX IF NOT EXISTS idx_news_published ON news(published)"
+# Частичные индексы по статусам, которые опрашиваются каждый цикл. В них попадают только
+# ожидающие обработки новости, поэтому они остаются маленькими, сколько бы ни было опубликовано
+SQL_CREATE_STATUS_INDEXES = tuple(
+    f"CREATE INDEX IF NOT EXISTS idx_news_{status} ON news(published) WHERE published = '{status}'"
+    for status in ('no', 'fetched', 'processed')
+)
+SQL_INSERT_NEWS = ("INSERT OR IGNORE INTO news (title_hash, title, link, thumbnail_url, source) "
+                   "VALUES (?, ?, ?, ?, ?)")
+# Перенос таблицы старого формата (title TEXT PRIMARY KEY) в новую схему
+SQL_RENAME_OLD_NEWS = "ALTER TABLE news RENAME TO news_old"
+SQL_DROP_OLD_NEWS = "DROP TABLE news_old"
+# В старой схеме title не был NOT NULL, и новости без заголовка сохранялись. Для них нельзя
+# вычислить title_hash, поэтому при переносе они отбрасываются
+SQL_COUNT_OLD_UNTITLED = "SELECT COUNT(*) FROM news_old WHERE title IS NULL"
+# Столбцы, которые есть в SQL_CREATE_NEWS; остальные столбцы старой таблицы добавляются при переносе
+NEWS_BASE_COLUMNS = ('title', 'link', 'thumbnail_url', 'source', 'published')
 
 
 # --- РАБОТА С БАЗОЙ ДАННЫХ ---
+def migrate_news_to_title_hash(conn: sqlite3.Connection):
+    """
+    Переводит таблицу старого формата (title TEXT PRIMARY KEY) на ключи id + title_hash.
+    Таблица пересоздается одной транзакцией, все данные и дополнительные столбцы сохраняются.
+    """
+    columns = conn.execute("PRAGMA table_info(news)").fetchall()
+    names = [column[1] for column in columns]
+    if not names or 'title_hash' in names:
+        return
+
+    logger.info("Перевод таблицы 'news' на ключ id + title_hash...")
+    conn.create_function('title_hash', 1, title_hash, deterministic=True)
+    copied = ', '.join(names)
+    with conn:
+        conn.execute("BEGIN")
+        conn.execute(SQL_RENAME_OLD_NEWS)
+        conn.execute(SQL_CREATE_NEWS)
+        # Столбцы, добавленные другими этапами (full_text, title_ru, ...)
+        for _, name, col_type, _, default, _ in columns:
+            if name not in NEWS_BASE_COLUMNS:
+                default_sql = f" DEFAULT {default}" if default is not None else ""
+                conn.execute(f"ALTER TABLE news ADD COLUMN {name} {col_type}{default_sql}")
+        untitled = conn.execute(SQL_COUNT_OLD_UNTITLED).fetchone()[0]
+        conn.execute(f"INSERT INTO news (title_hash, {copied}) "
+                     f"SELECT title_hash(title), {copied} FROM news_old WHERE title IS NOT NULL")
+        conn.execute(SQL_DROP_OLD_NEWS)
+    if untitled:
+        logger.warning(f"При переносе отброшено {untitled} новостей без заголовка.")
+    logger.info("Таблица 'news' переведена на ключ id + title_hash.")
+
+
 def init_db(db_name: str):
     """Создает таблицу новостей, если она не существует."""
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-
-    # Создаем таблицу с полями title (уникальный), link, description, thumbnail_url, source, published
-    # title будет PRIMARY KEY для простоты проверки дубликатов
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS news (
-            title TEXT PRIMARY KEY,
-            link TEXT NOT NULL,
-            thumbnail_url TEXT,
-            source TEXT NOT NULL,
-            published TEXT NOT NULL DEFAULT 'no'
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    conn = get_connection(db_name)
+    migrate_news_to_title_hash(conn)
+
+    # Создаем таблицу с полями id, title_hash (уникальный), title, link, thumbnail_url, source, published
+    with conn:
+        conn.execute(SQL_CREATE_NEWS)
+        conn.execute(SQL_CREATE_PUBLISHED_INDEX)
+        for sql in SQL_CREATE_STATUS_INDEXES:
+            conn.execute(sql)
     logger.info(f"База данных '{db_name}' инициализирована.")
 
 
-def save_news_to_db(db_name: str, news_item: Dict[str, Any]) -> bool:
+def save_news_batch_to_db(db_name: str, news_items: List[Dict[str, Any]]) -> int:
     """
-    Сохраняет одну новость в базу данных, если её ещё нет.
-    Возвращает True, если новость была добавлена, False - если дубликат.
+    Сохраняет пачку новостей в базу данных одной транзакцией, пропуская дубликаты.
+    Возвращает количество добавленных новостей.
     """
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    if not news_items:
+        return 0
+
+    conn = get_connection(db_name)
+    # Новости без заголовка или ссылки не сохраняются: заголовок нужен для title_hash,
+    # а новость без ссылки отбросил бы INSERT OR IGNORE по ограничению NOT NULL
+    rows = [
+        (title_hash(item['title']), item['title'], item['link'], item['thumbnail_url'], item['source'])
+        for item in news_items if item['title'] and item['link']
+    ]
+    if len(rows) < len(news_items):
+        logger.warning(f"Пропущено {len(news_items) - len(rows)} новостей без заголовка или ссылки.")
 
     try:
-        # Используем INSERT OR IGNORE для предотвращения ошибки при дубликате
-        # Так как title - PRIMARY KEY, дубликат вызовет IntegrityError,
-        # которую мы подавляем с помощью IGNORE
-        cursor.execute('''
-            INSERT OR IGNORE INTO news 
-            (title, link, thumbnail_url, source) 
-            VALUES (?, ?, ?, ?)
-        ''', (
-            news_item['title'],
-            news_item['link'],
-            news_item['thumbnail_url'],
-            news_item['source']
-        ))
-
-        conn.commit()
-        # Если rowcount == 1, значит строка была вставлена
-        # Если rowcount == 0, значит строка с таким title уже была (дубликат)
-        rows_affected = cursor.rowcount
-        return rows_affected > 0
+        # INSERT OR IGNORE для всей пачки и один commit (один fsync) вместо commit на каждую новость.
+        # Так как title_hash уникален, дубликаты молча пропускаются
+        changes_before = conn.total_changes
+        with conn:
+            conn.executemany(SQL_INSERT_NEWS, rows)
+        # Разница total_changes - число реально вставленных строк
+        return conn.total_changes - changes_before
 
     except sqlite3.Error as e:
-        logger.error(f"Ошибка базы данных при сохранении новости '{news_item['title']}': {e}")
-        conn.rollback()
-        return False
-    finally:
-        conn.close()
+        logger.error(f"Ошибка базы данных при сохранении {len(rows)} новостей: {e}")
+        return 0
 
 
 # --- КОНФИГУРАЦИЯ ПАРСИНГА ---
+# Пространство имен Media RSS (теги media:thumbnail, media:content)
+MEDIA_NS = '{http://search.yahoo.com/mrss/}'
+
+
+def element_text(element) -> str:
+    """Текст элемента со всеми вложенными узлами, без пробелов по краям (как get_text(strip=True))"""
+    return ''.join(text.strip() for text in element.itertext())
+
+
 def parse_item_default(item, source_name: str) -> Optional[Dict[str, Any]]:
     """Универсальный парсер элемента RSS. Сохраняет только URL миниатюры."""
     try:
@@ -88,15 +157,15 @@ def parse_item_default(item, source_name: str) -> Optional[Dict[str, Any]]:
         link_tag = item.find('link')
 
         entry = {
-            'title': title_tag.get_text(strip=True) if title_tag else None,
-            'link': link_tag.get_text(strip=True) if link_tag else None,
+            'title': element_text(title_tag) if title_tag is not None else None,
+            'link': element_text(link_tag) if link_tag is not None else None,
             'thumbnail_url': None,
             'source': source_name
         }
 
         # Парсинг <media:thumbnail> - только URL
-        thumbnail_tag = item.find('media:thumbnail')
-        if thumbnail_tag and thumbnail_tag.get('url'):
+        thumbnail_tag = item.find(f'.//{MEDIA_NS}thumbnail')
+        if thumbnail_tag is not None and thumbnail_tag.get('url'):
             entry['thumbnail_url'] = thumbnail_tag.get('url').strip()
 
         return entry
@@ -115,8 +184,8 @@ def parse_item_cnet(item, source_name: str) -> Optional[Dict[str, Any]]:
         # Если стандартный thumbnail_url не найден, попробуем media:content
         if not entry.get('thumbnail_url'):
             # Ищем media:content с medium="image"
-            content_tag = item.find('media:content', attrs={"medium": "image"})
-            if content_tag and content_tag.get('url'):
+            content_tag = item.find(f'.//{MEDIA_NS}content[@medium="image"]')
+            if content_tag is not None and content_tag.get('url'):
                 entry['thumbnail_url'] = content_tag.get('url', '').strip()
 
         return entry
@@ -131,8 +200,8 @@ def parse_item_copmweek(item, source_name: str) -> Optional[Dict[str, Any]]:
             return None
 
         if not entry.get('thumbnail_url'):
-            content_tag = item.find('image')
-            entry['thumbnail_url'] = content_tag.get_text(strip=True)
+            content_tag = item.find('.//image')
+            entry['thumbnail_url'] = element_text(content_tag)
 
         return entry
     except Exception as e:
@@ -149,74 +218,88 @@ PARSERS = {
 
 
 # --- ЛОГИКА ПАРСИНГА ---
-def parse_single_rss_feed(source_name: str, rss_url: str) -> List[Dict[str, Any]]:
+def parse_rss_items(content: bytes, source_name: str) -> List[Dict[str, Any]]:
     """
-    Парсит один RSS-фид с учетом специфики источника.
+    Потоково разбирает XML одного RSS-фида с учетом специфики источника.
+    Каждый <item> обрабатывается сразу после разбора и освобождается.
+    """
+    news = []
+    items_count = 0
+    parser_func: Callable = PARSERS.get(source_name, parse_item_default)
+
+    for _, item in etree.iterparse(io.BytesIO(content), events=('end',), tag='item',
+                                   recover=True, resolve_entities=False):
+        items_count += 1
+        entry = parser_func(item, source_name)
+        if entry:
+            news.append(entry)
+
+        # Освобождаем обработанный элемент и уже пройденных соседей
+        item.clear()
+        while item.getprevious() is not None:
+            del item.getparent()[0]
+
+    logger.info(f"Найдено {items_count} элементов в {source_name}")
+    logger.info(f"✔️ Успешно обработано {len(news)} новостей из {source_name}")
+    return news
+
+
+async def parse_single_rss_feed(client: httpx.AsyncClient, semaphore: asyncio.Semaphore,
+                                rate_limiter: HostRateLimiter, source_name: str,
+                                rss_url: str) -> List[Dict[str, Any]]:
+    """
+    Загружает и парсит один RSS-фид с учетом специфики источника.
     """
     try:
-        logger.info(f"Получение данных из: {source_name} ({rss_url})")
-        # Добавим User-Agent, чтобы избежать блокировок
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(rss_url.strip(), timeout=15, headers=headers)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'xml')
-
-        news = []
-        items = soup.find_all('item')
-        logger.info(f"Найдено {len(items)} элементов в {source_name}")
-
-        parser_func: Callable = PARSERS.get(source_name, parse_item_default)
-
-        for item in items:
-            entry = parser_func(item, source_name)
-            if entry:
-                news.append(entry)
-
-        logger.info(f"✔️ Успешно обработано {len(news)} новостей из {source_name}")
-        return news
-
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка сети при запросе {source_name} ({rss_url}): {e}")
+        # Пауза выдерживается только между лентами одного сайта (WIRED Science и WIRED Business)
+        await rate_limiter.wait(rss_url.strip())
+        # Семафор ограничивает число одновременных запросов вместо пауз между лентами
+        async with semaphore:
+            logger.info(f"Получение данных из: {source_name} ({rss_url})")
+            response = await client.get(rss_url.strip(), headers=RSS_HEADERS, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            content = response.content
+
+        # Разбор XML выполняется в пуле потоков, чтобы не блокировать event loop
+        return await asyncio.get_running_loop().run_in_executor(None, parse_rss_items, content, source_name)
+
+    except httpx.HTTPError as e:
+        logger.error(f"Ошибка сети при запросе {source_name} ({rss_url}): {e}")
         return []
     except Exception as e:
-        import traceback
         logger.error(f"Ошибка парсинга {source_name} ({rss_url}): {e}")
-        # traceback.print_exc()
         return []
 
 
-def parse_and_save_multiple_rss_feeds(rss_feeds_dict: Dict[str, str], db_name: str) -> int:
+async def parse_and_save_multiple_rss_feeds(rss_feeds_dict: Dict[str, str], db_name: str) -> int:
     """
-    Парсит несколько RSS-фидов и сохраняет уникальные новости в базу данных.
+    Параллельно парсит несколько RSS-фидов и сохраняет уникальные новости в базу данных.
     Возвращает количество добавленных новостей.
     """
     added_count = 0
-    feed_items = list(rss_feeds_dict.items())
-    random.shuffle(feed_items)
-
-    for name, url in feed_items:
-        news_from_source = parse_single_rss_feed(name, url)
-        for item in news_from_source:
-            # Пытаемся сохранить новость в БД
-            is_new = save_news_to_db(db_name, item)
-            if is_new:
-                added_count += 1
-        time.sleep(random.uniform(0.5, 2.0))
+    semaphore = asyncio.Semaphore(CONCURRENT_FEEDS)
+    rate_limiter = HostRateLimiter()
+    # Общий с загрузкой статей клиент: соединения с сайтами переиспользуются между циклами
+    client = get_client()
+
+    tasks = [
+        parse_single_rss_feed(client, semaphore, rate_limiter, name, url)
+        for name, url in rss_feeds_dict.items()
+    ]
+    # Сохраняем каждую ленту по готовности одной транзакцией
+    for next_done in asyncio.as_completed(tasks):
+        news_from_source = await next_done
+        added_count += save_news_batch_to_db(db_name, news_from_source)
 
     logger.info(f"\n✔️ Парсинг завершен. Добавлено новых новостей в БД: {added_count}")
     return added_count
 
 
 # --- ОСНОВНАЯ ЧАСТЬ ---
-def start_parsing():
+async def start_parsing():
     # 1. Инициализируем базу данных
     init_db(DB_NAME)
 
     # 2. Парсим ленты и сохраняем в БД
     logger.info(f"Начинаем парсинг RSS-лент и сохранение в БД...")
-    total_added = parse_and_save_multiple_rss_feeds(RSS_FEEDS, DB_NAME)
-
-
+    total_added = await parse_and_save_multiple_rss_feeds(RSS_FEEDS, DB_NAME)
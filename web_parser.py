@@ -1,113 +1,180 @@
 # web_parser.py
 import sqlite3
 import asyncio
-import requests
+import httpx
 import logging
-import time
-import random
-from parsers.cnet import fetch_text_cnet
-from parsers.compweekly import fetch_text_computerweekly
-from parsers.engadget import fetch_text_engadget
-from parsers.wired import fetch_text_wired
+from db import get_connection, title_hash
+from http_client import CONNECTIONS_PER_HOST, HostRateLimiter, get_client
+from parsers._htmlparser import html_parser
+from parsers._textutils import host_in_domains
+from parsers.cnet import extract_text_cnet
+from parsers.compweekly import extract_text_computerweekly
+from parsers.engadget import extract_text_engadget
+from parsers.wired import extract_text_wired
 # --- НАСТРОЙКИ ---
 DB_NAME = 'news.db'
 REQUEST_TIMEOUT = 20
+# Сколько результатов накапливается перед записью в БД одной транзакцией
+UPDATE_BATCH_SIZE = 32
+# Заголовки запросов статей (Referer добавляется для каждого сайта)
+ARTICLE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# --- SQL-ЗАПРОСЫ ---
+SQL_MARK_FETCH_FAILED = "UPDATE news SET published = 'fetch_failed' WHERE title_hash = ?"
+SQL_ADD_FULL_TEXT_COLUMN = "ALTER TABLE news ADD COLUMN full_text TEXT"
+SQL_SELECT_UNFETCHED = "SELECT title, link, source FROM news WHERE published = 'no'"
+SQL_UPDATE_FULL_TEXT = "UPDATE news SET full_text = ?, published = 'fetched' WHERE title_hash = ?"
+
 
 # --- СЛОВАРЬ СООТВЕТСТВИЯ ДОМЕНОВ И ФУНКЦИЙ ПАРСИНГА ---
-# Ключ - домен или часть URL, значение - функция парсинга
+# Ключ - домен сайта (подходят и его поддомены), значение - функция парсинга.
+# Функция получает загруженную страницу (bytes) и lxml-парсер и возвращает текст статьи
 PARSERS_FOR_SITES = {
-    'wired.com': fetch_text_wired,
-    'cnet.com': fetch_text_cnet,
-    'computerweekly.com': fetch_text_computerweekly,
-    'engadget.com': fetch_text_engadget
+    'wired.com': extract_text_wired,
+    'cnet.com': extract_text_cnet,
+    'computerweekly.com': extract_text_computerweekly,
+    'engadget.com': extract_text_engadget
 }
 
-# --- ФУНКЦИИ РАБОТЫ С БД ---
-def update_news_status_to_failed(db_name: str, title: str):
+def find_site_domain(link: str) -> str | None:
     """
-    Обновляет статус новости на 'fetch_failed'.
+    Возвращает домен из PARSERS_FOR_SITES, которому принадлежит ссылка, или None.
+    Проверяет хост ссылки и его родительские домены (www.wired.com -> wired.com) по словарю.
     """
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            "UPDATE news SET published = 'fetch_failed' WHERE title = ?",
-            (title,)
-        )
-        conn.commit()
-        if cursor.rowcount > 0:
-            logger.info(f"Статус новости '{title[:50]}...' обновлён на 'fetch_failed'.")
-        else:
-            logger.warning(f"Новость '{title[:50]}...' не найдена при попытке обновить статус на 'fetch_failed'.")
-    except sqlite3.Error as e:
-        logger.error(f"Ошибка БД при обновлении статуса новости '{title[:50]}...' на 'fetch_failed': {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+    return host_in_domains(link, PARSERS_FOR_SITES)
 
+# --- ФУНКЦИИ РАБОТЫ С БД ---
 def init_db_for_full_text(db_name: str):
     """Добавляет поле full_text в таблицу news, если оно отсутствует."""
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    conn = get_connection(db_name)
     try:
-        cursor.execute("PRAGMA table_info(news)")
-        columns = [info[1] for info in cursor.fetchall()]
+        columns = [info[1] for info in conn.execute("PRAGMA table_info(news)").fetchall()]
         if 'full_text' not in columns:
             logger.info("Добавление столбца 'full_text' в таблицу 'news'...")
-            cursor.execute("ALTER TABLE news ADD COLUMN full_text TEXT")
-            conn.commit()
+            with conn:
+                conn.execute(SQL_ADD_FULL_TEXT_COLUMN)
             logger.info("Столбец 'full_text' успешно добавлен.")
         else:
             logger.info("Столбец 'full_text' уже существует.")
     except sqlite3.Error as e:
         logger.error(f"Ошибка при инициализации БД для полного текста: {e}")
-    finally:
-        conn.close()
 
 def get_unfetched_news(db_name: str) -> list:
     """Получает список новостей, полный текст которых еще не извлечен (published = 'no')."""
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    conn = get_connection(db_name)
     try:
         # Выбираем только необходимые поля
-        cursor.execute("SELECT title, link, source FROM news WHERE published = 'no'")
-        rows = cursor.fetchall()
+        rows = conn.execute(SQL_SELECT_UNFETCHED).fetchall()
         return [{'title': row[0], 'link': row[1], 'source': row[2]} for row in rows]
     except sqlite3.Error as e:
         logger.error(f"Ошибка при получении новостей из БД: {e}")
         return []
-    finally:
-        conn.close()
 
-def update_news_full_text(db_name: str, title: str, full_text: str):
+def save_fetch_results(db_name: str, fetched: list, failed: list) -> int:
     """
-    Обновляет полный текст новости и устанавливает статус 'fetched'.
+    Сохраняет пачку результатов одной транзакцией: тексты статей (статус 'fetched')
+    и новости с пустым текстом (статус 'fetch_failed').
+    fetched - пары (full_text, title_hash), failed - кортежи (title_hash,).
+    Возвращает количество новостей, для которых сохранен текст.
     """
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    conn = get_connection(db_name)
     try:
-        cursor.execute(
-            "UPDATE news SET full_text = ?, published = 'fetched' WHERE title = ?",
-            (full_text, title)
-        )
-        conn.commit()
-        if cursor.rowcount > 0:
-            logger.info(f"✔️ Новость '{title}' обновлена в БД (статус: fetched).")
-        else:
-            logger.warning(f"Новость '{title}' не найдена в БД при попытке обновления full_text.")
+        with conn:
+            saved = conn.executemany(SQL_UPDATE_FULL_TEXT, fetched).rowcount
+            conn.executemany(SQL_MARK_FETCH_FAILED, failed)
+        logger.info(f"✔️ Сохранено в БД: {saved} текстов (статус: fetched), {len(failed)} помечено как 'fetch_failed'.")
+        if saved < len(fetched):
+            logger.warning(f"{len(fetched) - saved} новостей не найдено в БД при попытке обновления full_text.")
+        return saved
     except sqlite3.Error as e:
-        logger.error(f"Ошибка БД при обновлении full_text новости '{title}': {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        logger.error(f"Ошибка БД при сохранении пачки из {len(fetched) + len(failed)} результатов: {e}")
+        return 0
 
 # --- ОСНОВНАЯ ЛОГИКА ---
 
-def fetch_full_texts():
+def parse_article(parser_func, html_bytes: bytes, encoding: str | None):
+    """Разбирает загруженную статью в потоке пула парсером этого потока"""
+    return parser_func(html_bytes, html_parser(encoding))
+
+
+async def fetch_article(client, headers: dict, news_item: dict, parser_func):
+    """
+    Загружает одну статью и возвращает пару (новость, текст или исключение).
+    Страница загружается в event loop, а разбирается в общем пуле потоков,
+    поэтому загрузка следующих статей не ждет разбора.
+    """
+    try:
+        async with asyncio.timeout(REQUEST_TIMEOUT):
+            response = await client.get(news_item['link'], headers=headers)
+            response.raise_for_status()
+        full_text = await asyncio.get_running_loop().run_in_executor(
+            None, parse_article, parser_func, response.content, response.charset_encoding)
+        return news_item, full_text
+    except Exception as e:
+        return news_item, e
+
+
+async def domain_worker(client, rate_limiter: HostRateLimiter, domain: str, news_iter, results: asyncio.Queue):
+    """
+    Загружает статьи одного сайта по очереди и передает результаты писателю БД.
+    Несколько воркеров одного сайта разбирают общий итератор новостей,
+    а rate_limiter выдерживает паузу между запросами к сайту.
+    """
+    parser_func = PARSERS_FOR_SITES[domain]
+    headers = {**ARTICLE_HEADERS, 'Referer': f'https://www.{domain}/'}
+    for news_item in news_iter:
+        await rate_limiter.wait(news_item['link'])
+        await results.put(await fetch_article(client, headers, news_item, parser_func))
+
+
+async def db_writer(results: asyncio.Queue) -> int:
+    """
+    Единственный писатель в БД: сохраняет результаты из очереди пачками по UPDATE_BATCH_SIZE.
+    Возвращает количество сохраненных статей. Очередь завершается значением None.
+    """
+    fetched_count = 0
+    fetched, failed = [], []
+    while (result := await results.get()) is not None:
+        news_item, full_text = result
+        title = news_item['title']
+        link = news_item['link']
+
+        if isinstance(full_text, (httpx.HTTPError, asyncio.TimeoutError)):
+            logger.error(f"Ошибка сети при получении статьи {link}: {full_text}")
+            # Переходим к следующей новости, статус не меняем
+            continue
+        if isinstance(full_text, Exception):
+            # Любые другие исключения, которые могут возникнуть в парсере
+            logger.error(f"Неожиданная ошибка при парсинге статьи {link}: {full_text}", exc_info=full_text)
+            continue
+
+        if not full_text:
+            logger.warning(f"Парсер вернул пустой текст для статьи '{title}'. Обновление статуса.")
+            # Обновляем статус новости на 'fetch_failed'
+            failed.append((title_hash(title),))
+        else:
+            # Сохраняем текст в БД и обновляем статус на 'fetched'
+            fetched.append((full_text, title_hash(title)))
+
+        # Запись в БД выполняется в пуле потоков, чтобы не останавливать загрузку статей в event loop
+        if len(fetched) + len(failed) >= UPDATE_BATCH_SIZE:
+            fetched_count += await asyncio.to_thread(save_fetch_results, DB_NAME, fetched, failed)
+            fetched, failed = [], []
+
+    # Сохраняем остаток
+    if fetched or failed:
+        fetched_count += await asyncio.to_thread(save_fetch_results, DB_NAME, fetched, failed)
+    return fetched_count
+
+
+async def fetch_full_texts():
     """Основная функция извлечения полного текста для новостей."""
     logger.info("=== Начало извлечения полного текста статей ===")
 
@@ -122,57 +189,38 @@ def fetch_full_texts():
         return
 
     logger.info(f"Найдено {len(unfetched_news)} новостей для обработки.")
-    fetched_count = 0
 
-    # 3. Обрабатываем каждую новость
+    # 3. Группируем новости по сайтам, определяя парсер на основе URL
+    jobs_by_domain = {}
     for news_item in unfetched_news:
-        title = news_item['title']
         link = news_item['link']
-        source = news_item['source'] # Можно использовать для логгирования
-
-        logger.info(f"--- Обработка: {title[:50]}... ---")
-
-        # 4. Определяем, какой парсер использовать на основе URL
-        parser_func = None
-        for domain, func in PARSERS_FOR_SITES.items():
-            if domain in link:
-                parser_func = func
-                break
-
-        if not parser_func:
+        domain = find_site_domain(link)
+        if not domain:
             logger.warning(f"Не найден парсер для домена в URL: {link}. Пропуск.")
             # Можно обновить статус на 'no_parser' или подобное
             continue
 
-        # 5. Извлекаем текст с помощью выбранного парсера
-        full_text = None
-        try:
-            full_text = parser_func(link)
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка сети при получении статьи {link}: {e}")
-            # Продолжаем цикл, переходя к следующей новости
-            continue
-        except Exception as e:
-            # Ловим любые другие исключения, которые могут возникнуть в парсере
-            logger.error(f"Неожиданная ошибка при парсинге статьи {link}: {e}", exc_info=True)
-            # Продолжаем цикл, переходя к следующей новости
-            continue
-
-        if not full_text:
-            logger.warning(f"Парсер вернул пустой текст для статьи '{title}'. Обновление статуса.")
-            # Обновляем статус новости на 'fetch_failed'
-            update_news_status_to_failed(DB_NAME, title)
-            continue  # Переход к следующей новости
-            # --- КОНЕЦ ИЗМЕНЕНИЯ ---
-
-            # 6. Сохраняем текст в БД и обновляем статус на 'fetched'
-        update_news_full_text(DB_NAME, title, full_text)
-        fetched_count += 1
-        # 7. Небольшая задержка между запросами
-        time.sleep(random.uniform(1, 2)) # Используем random для более естественной задержки
+        jobs_by_domain.setdefault(domain, []).append(news_item)
+
+    # 4. Сайты обрабатываются параллельно, внутри сайта - не больше CONNECTIONS_PER_HOST запросов сразу
+    #    и не чаще одного запроса в HOST_MIN_INTERVAL секунд.
+    #    Результаты сохраняет один писатель, поэтому запись в БД не конкурирует сама с собой
+    #    Клиент общий с загрузкой RSS-лент, поэтому соединения с сайтами уже могут быть открыты
+    client = get_client()
+    # Паузы между запросами к одному сайту (как при загрузке RSS): параллельные воркеры сайта
+    # не ускоряют обращения к нему, а только перекрывают ожидание ответа и разбор статей
+    rate_limiter = HostRateLimiter()
+    results = asyncio.Queue()
+    writer = asyncio.create_task(db_writer(results))
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for domain, domain_news in jobs_by_domain.items():
+                news_iter = iter(domain_news)
+                for _ in range(min(CONNECTIONS_PER_HOST, len(domain_news))):
+                    tg.create_task(domain_worker(client, rate_limiter, domain, news_iter, results))
+    finally:
+        # 5. Сообщаем писателю, что новых результатов не будет, и дожидаемся сохранения остатка
+        await results.put(None)
+        fetched_count = await writer
 
     logger.info(f"=== ✔️ Извлечение текста завершено. Обработано: {fetched_count} ===")
-
-
-
-
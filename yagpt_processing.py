@@ -1,162 +1,505 @@
+import asyncio
+import concurrent.futures
+import functools
+import grpc
+import hashlib
 import sqlite3
-from typing import Optional
+import json
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
 import logging
-import time
 import os
+import threading
+import time
 from dotenv import load_dotenv
 from yandex_cloud_ml_sdk import YCloudML
+from yandex_cloud_ml_sdk.retry import RetryPolicy
+from db import get_connection, get_read_connection, write_transaction
 
 # --- НАСТРОЙКИ ---
 DB_NAME = 'news.db'
-
-# Получаем настройки из переменных окружения
-load_dotenv()
-YC_FOLDER_ID = os.getenv('YC_FOLDER_ID')
-YC_API_KEY = os.getenv('YC_API_KEY')
-
-if not YC_FOLDER_ID:
-    raise ValueError("YC_FOLDER_ID не установлен. Пожалуйста, установите переменную окружения.")
+# Сколько новостей обрабатывается одновременно в одном каталоге Yandex Cloud
+YAGPT_CONCURRENCY = 4
+# Ограничение частоты запросов к API одного каталога: в среднем REQUESTS_PER_SECOND, всплеском не больше REQUESTS_BURST
+REQUESTS_PER_SECOND = 2
+REQUESTS_BURST = 4
+# Повторы запросов при временных ошибках API (выполняет SDK): число попыток и пауза (растет вдвое), секунды
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 30
+# Сколько обработанных новостей накапливается перед записью в БД одной транзакцией
+UPDATE_BATCH_SIZE = 16
+# Ограничение длины входного текста, символов (Можно настроить)
+MAX_INPUT_CHARS = 3000
+# Текст короче этого порога (символов) считается не извлеченным: модель переводит только заголовок
+MIN_INPUT_CHARS = 200
+# Модель и параметры генерации (входят в ключ кэша ответов)
+MODEL_NAME = "yandexgpt-lite"
+TEMPERATURE = 0.5
+# Ограничение длины ответа, токенов. Вход не длиннее MAX_INPUT_CHARS, поэтому пересказ с запасом
+# укладывается в лимит и JSON не обрывается на середине
+SUMMARY_MAX_TOKENS = 2000
+TITLE_MAX_TOKENS = 200
+# Задача для модели: перевод заголовка + перевод и краткий пересказ текста, готовый к публикации
+SYSTEM_PROMPT = "Ты профессиональный редактор и переводчик. Тебе дан английский заголовок и текст новости. Переведи заголовок на русский язык. Переведи текст на русский язык и предоставь краткий, ясный пересказ переведенного текста на русском языке. Пересказ должен быть готов к публикации, без дополнительных ремарок, вводных слов или пояснений. Сохрани ключевые факты и смысл. Сохрани все имена собственные (людей, компаний, продуктов) в оригинальном английском виде. Добавь подходящие по смылу эмодзи между абзацами пересказа. Верни только JSON вида {\"title_ru\": \"переведенный заголовок\", \"summary_ru\": \"пересказ\"}"
+# Задача для новостей без текста: только перевод заголовка
+TITLE_PROMPT = "Ты профессиональный редактор и переводчик. Тебе дан английский заголовок новости. Переведи его на русский язык. Сохрани все имена собственные (людей, компаний, продуктов) в оригинальном английском виде. Верни только JSON вида {\"title_ru\": \"переведенный заголовок\"}"
+# Структурированный ответ: модель возвращает JSON по схеме (в том числе с экранированными кавычками
+# внутри текста), а не пишет его сама по описанию в промпте
+SUMMARY_RESPONSE_FORMAT = {
+    "json_schema": {
+        "type": "object",
+        "properties": {
+            "title_ru": {"type": "string"},
+            "summary_ru": {"type": "string"},
+        },
+        "required": ["title_ru", "summary_ru"],
+    },
+}
+TITLE_RESPONSE_FORMAT = {
+    "json_schema": {
+        "type": "object",
+        "properties": {
+            "title_ru": {"type": "string"},
+        },
+        "required": ["title_ru"],
+    },
+}
+
+# Коды ошибок gRPC, после которых запрос имеет смысл повторить. Ошибки запроса
+# (INVALID_ARGUMENT, PERMISSION_DENIED и т.п.) не повторяются
+RETRYABLE_CODES = frozenset({
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.INTERNAL,
+    grpc.StatusCode.ABORTED,
+})
+# Политика повторов SDK. По умолчанию SDK повторяет только UNAVAILABLE и RESOURCE_EXHAUSTED,
+# поэтому коды задаются явно; собственный цикл повторов поверх SDK не нужен
+RETRY_POLICY = RetryPolicy(max_attempts=RETRY_ATTEMPTS, initial_backoff=RETRY_BASE_DELAY,
+                           max_backoff=RETRY_MAX_DELAY, backoff_multiplier=2, retriable_codes=RETRYABLE_CODES)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# --- SQL-ЗАПРОСЫ ---
+SQL_ADD_TITLE_RU_COLUMN = "ALTER TABLE news ADD COLUMN title_ru TEXT"
+SQL_ADD_PROCESSED_TEXT_COLUMN = "ALTER TABLE news ADD COLUMN processed_full_text TEXT"
+SQL_CREATE_CACHE = "CREATE TABLE IF NOT EXISTS yagpt_cache (key TEXT PRIMARY KEY, response TEXT, ts INTEGER)"
+SQL_SELECT_CACHED = "SELECT response FROM yagpt_cache WHERE key = ?"
+SQL_STORE_CACHED = "INSERT OR REPLACE INTO yagpt_cache (key, response, ts) VALUES (?, ?, ?)"
+# Индекс по статусу (создается и в rss_parser.init_db) - выборка 'fetched' идет по индексу, а не полным проходом
+SQL_CREATE_PUBLISHED_INDEX = "CREATE INDEX IF NOT EXISTS idx_news_published ON news(published)"
+SQL_SELECT_FETCHED = "SELECT id, title, full_text FROM news WHERE published = 'fetched'"
+SQL_UPDATE_PROCESSED = "UPDATE news SET title_ru = ?, processed_full_text = ?, published = 'processed' WHERE id = ?"
+SQL_SELECT_NEWS_ID = "SELECT 1 FROM news WHERE id = ?"
+# Статус 'processing' - новость отправлена в YandexGPT, но результат еще не сохранен
+SQL_MARK_PROCESSING = "UPDATE news SET published = 'processing' WHERE id = ?"
+SQL_RELEASE_PROCESSING = "UPDATE news SET published = 'fetched' WHERE id = ? AND published = 'processing'"
+SQL_RECLAIM_PROCESSING = "UPDATE news SET published = 'fetched' WHERE published = 'processing'"
+# Статус 'process_failed' - модель ответила не в ожидаемом формате (отказ, обрезанный JSON).
+# Повтор запроса дал бы тот же ответ, поэтому новость больше не обрабатывается
+SQL_MARK_PROCESS_FAILED = "UPDATE news SET published = 'process_failed' WHERE id = ?"
+
 
 # --- ФУНКЦИИ РАБОТЫ С YANDEX CLOUD через SDK ---
-def process_text_with_yacloud_sdk(text: str) -> Optional[str]:
+class TokenBucket:
+    """
+    Ограничитель частоты запросов ("корзина токенов"), общий для потоков пула.
+    Пока квота не исчерпана, запросы идут без пауз; ждать приходится только при превышении.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Забирает токен; если токенов нет, ждет, пока накопится следующий"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Токен резервируется сразу: ожидающие потоки выстраиваются в очередь через отрицательный баланс
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+# БД, схема которых уже проверена в этом процессе: при повторных запусках обработки
+# столбцы и таблица кэша не проверяются заново
+_SCHEMA_READY = set()
+
+
+@dataclass(frozen=True, slots=True)
+class YandexCloudConfig:
+    """Настройки доступа к одному каталогу Yandex Cloud из переменных окружения"""
+    folder_id: str
+    api_key: Optional[str]
+
+
+def _env_list(name: str) -> List[str]:
+    """Значения переменной окружения, перечисленные через запятую"""
+    return [value.strip() for value in os.getenv(name, '').split(',') if value.strip()]
+
+
+@functools.lru_cache(maxsize=None)
+def _config() -> Tuple[YandexCloudConfig, ...]:
+    """
+    Читает настройки из .env и переменных окружения при первом обращении (а не при импорте модуля).
+    Несколько каталогов задаются через запятую в YC_FOLDER_IDS и YC_API_KEYS (один ключ - общий
+    для всех каталогов), один каталог - в YC_FOLDER_ID и YC_API_KEY.
+    Если каталоги не заданы, бросает ValueError; такой результат не кэшируется.
+    """
+    load_dotenv()
+    folder_ids = _env_list('YC_FOLDER_IDS') or _env_list('YC_FOLDER_ID')
+    if not folder_ids:
+        raise ValueError("YC_FOLDER_ID не установлен. Пожалуйста, установите переменную окружения.")
+    api_keys = _env_list('YC_API_KEYS') or _env_list('YC_API_KEY') or [None]
+    if len(api_keys) == 1:
+        api_keys = api_keys * len(folder_ids)
+    if len(api_keys) != len(folder_ids):
+        raise ValueError(f"Количество ключей в YC_API_KEYS ({len(api_keys)}) не совпадает "
+                         f"с количеством каталогов в YC_FOLDER_IDS ({len(folder_ids)}).")
+    return tuple(YandexCloudConfig(folder_id=folder_id, api_key=api_key)
+                 for folder_id, api_key in zip(folder_ids, api_keys))
+
+
+@dataclass(slots=True)
+class YandexEndpoint:
+    """Клиент SDK одного каталога и ограничитель частоты запросов к его квоте"""
+    folder_id: str
+    sdk: YCloudML
+    rate_limiter: TokenBucket
+
+
+@functools.lru_cache(maxsize=None)
+def get_endpoints() -> Tuple[YandexEndpoint, ...]:
+    """
+    Возвращает клиенты Yandex Cloud SDK для всех каталогов из настроек.
+    Квоты у каталогов независимые, поэтому у каждого клиента свой ограничитель частоты.
+    Клиенты создаются при первом обращении и переиспользуются для всех запросов.
+    """
+    # auth можно передать напрямую как API-ключ, или использовать другие методы (например, IAM-токен).
+    # Вызовы API выполняются в потоках пула, поэтому ограничитель синхронный и потокобезопасный
+    return tuple(YandexEndpoint(folder_id=config.folder_id,
+                                sdk=YCloudML(folder_id=config.folder_id, auth=config.api_key,
+                                            retry_policy=RETRY_POLICY),
+                                rate_limiter=TokenBucket(REQUESTS_PER_SECOND, REQUESTS_BURST))
+                 for config in _config())
+
+
+@functools.lru_cache(maxsize=None)
+def get_sdk_executor() -> concurrent.futures.ThreadPoolExecutor:
+    """
+    Возвращает пул потоков для запросов к API: по потоку на каждый слот обработки (YAGPT_CONCURRENCY на каталог).
+    SDK синхронный, и запрос занимает поток и во время ожидания квоты и повторов, поэтому
+    у запросов свой пул, а общий пул event loop остается свободным для разбора статей и RSS.
     """
-    Отправляет текст в Yandex GPT через официальный SDK и возвращает обработанный результат.
+    return concurrent.futures.ThreadPoolExecutor(max_workers=YAGPT_CONCURRENCY * len(get_endpoints()),
+                                                 thread_name_prefix='yagpt')
+
+
+def run_model(model, messages: list, rate_limiter: TokenBucket):
+    """
+    Выполняет запрос к модели, дождавшись свободной квоты запросов к API.
+    Временные ошибки API повторяет сам SDK по политике RETRY_POLICY.
+    """
+    rate_limiter.acquire()
+    logger.info("Отправка запроса к Yandex GPT через SDK...")
+    return model.run(messages)
+
+
+def parse_answer(text: str, with_summary: bool) -> Tuple[str, str]:
+    """Извлекает из ответа модели пару (переведенный заголовок, пересказ); без пересказа он пустой"""
+    response = json.loads(text)
+    return response['title_ru'].strip(), (response['summary_ru'].strip() if with_summary else "")
+
+
+def _first_text(result) -> Optional[str]:
+    """
+    Возвращает текст первой (самой вероятной) альтернативы ответа модели или None,
+    если альтернатив нет
     """
-    if not text:
-        return ""
+    alternative = next(iter(result), None)
+    return alternative.text if alternative is not None else None
 
+
+def truncate_text(text: str, limit: int) -> str:
+    """
+    Обрезает текст до limit символов по границе слова, чтобы модель не получала оборванное слово.
+    Если пробела в последней пятой части нет (очень длинное "слово"), режет ровно по limit.
+    """
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    boundary = max(cut.rfind(' '), cut.rfind('\n'))
+    if boundary > limit * 0.8:
+        cut = cut[:boundary]
+    return cut.rstrip()
+
+
+def cache_key(messages: list, response_format: dict) -> str:
+    """Ключ кэша ответов: SHA-256 от сообщений, модели, температуры и схемы ответа"""
+    payload = json.dumps([messages, MODEL_NAME, TEMPERATURE, response_format], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def process_text_with_yacloud_sdk(title: str, text: str, endpoint: YandexEndpoint) -> Optional[Tuple[str, str]]:
+    """
+    Отправляет заголовок и текст в Yandex GPT одним запросом через официальный SDK.
+    Если текст короче MIN_INPUT_CHARS, переводится только заголовок, а пересказ остается пустым.
+    Возвращает пару (переведенный заголовок, обработанный текст), пару пустых строк,
+    если модель ответила не в формате JSON, или None при ошибке запроса.
+    """
     try:
-        # Инициализируем SDK
-        # auth можно передать напрямую как API-ключ, или использовать другие методы (например, IAM-токен)
-        sdk = YCloudML(folder_id=YC_FOLDER_ID, auth=YC_API_KEY)
-
-        # Ограничиваем длину входного текста
-        max_input_len = 3000  # Можно настроить
-        text_to_process = text[:max_input_len]
-
-        # Формируем сообщения для модели
-        messages = [
-            {
-                "role": "system",
-                # Уточняем задачу: перевод + краткий пересказ, готовый к публикации
-                "text": "Ты профессиональный редактор и переводчик. Переведи следующий английский текст на русский язык. Затем предоставь краткий, ясный пересказ переведенного текста на русском языке. Пересказ должен быть готов к публикации, без дополнительных ремарок, вводных слов или пояснений. Сохрани ключевые факты и смысл. Сохрани все имена собственные (людей, компаний, продуктов) в оригинальном английском виде. Добавь подходящие по смылу эмодзи между абзацами",
-            },
-            {
-                "role": "user",
-                "text": text_to_process,
-            },
-        ]
-
-        logger.info("Отправка запроса к Yandex GPT через SDK...")
+        with_summary = len((text or "").strip()) >= MIN_INPUT_CHARS
+        if with_summary:
+            # Формируем сообщения для модели: перевод заголовка и пересказ текста в одном запросе.
+            # Длину входного текста ограничиваем
+            text_to_process = truncate_text(text, MAX_INPUT_CHARS)
+            response_format, max_tokens = SUMMARY_RESPONSE_FORMAT, SUMMARY_MAX_TOKENS
+            messages = [
+                {
+                    "role": "system",
+                    "text": SYSTEM_PROMPT,
+                },
+                {
+                    "role": "user",
+                    "text": f"Заголовок: {title}\n\nТекст:\n{text_to_process}",
+                },
+            ]
+        else:
+            response_format, max_tokens = TITLE_RESPONSE_FORMAT, TITLE_MAX_TOKENS
+            messages = [
+                {
+                    "role": "system",
+                    "text": TITLE_PROMPT,
+                },
+                {
+                    "role": "user",
+                    "text": f"Заголовок: {title}",
+                },
+            ]
+
+        # Тот же запрос уже выполнялся (например, до сбоя): берем ответ из кэша
+        key = cache_key(messages, response_format)
+        cached = get_cached_response(DB_NAME, key)
+        if cached is not None:
+            logger.info("✔️ Ответ Yandex GPT взят из кэша.")
+            return parse_answer(cached, with_summary)
+
         # Выбираем модель (yandexgpt или yandexgpt-lite) и настраиваем параметры
         # yandexgpt-lite быстрее и дешевле, подходит для большинства задач
-        result = (
-            sdk.models.completions("yandexgpt-lite")  # Или "yandexgpt" для более мощной модели
+        model = (
+            endpoint.sdk.models.completions(MODEL_NAME)  # Или "yandexgpt" для более мощной модели
             .configure(
-                temperature=0.5,  # Более детерминированный результат
-                max_tokens=1000  # Ограничиваем длину ответа
+                temperature=TEMPERATURE,  # Более детерминированный результат
+                max_tokens=max_tokens,  # Ограничиваем длину ответа (заголовок + пересказ)
+                response_format=response_format  # Ответ - JSON по схеме
             )
-            .run(messages)
         )
-
-        # Обрабатываем результат
-        # result - это итератор по альтернативам, обычно берем первую (самую вероятную)
-        for alternative in result:
-            # alternative.text содержит сгенерированный текст
-            logger.info("✔️ Обработка Yandex GPT через SDK завершена.")
-            return alternative.text.strip()
-
-        # Если альтернатив не было
-        logger.warning("Yandex GPT SDK вернул пустой результат.")
-        return None
-
+        result = run_model(model, messages, endpoint.rate_limiter)
+
+        # Текст первой альтернативы содержит сгенерированный JSON
+        answer = _first_text(result)
+        if answer is None:
+            logger.warning("Yandex GPT SDK вернул пустой результат.")
+            return None
+
+        title_ru, summary_ru = parse_answer(answer, with_summary)
+        # В кэш попадают только корректные ответы
+        store_cached_response(DB_NAME, key, answer)
+        logger.info("✔️ Обработка Yandex GPT через SDK завершена.")
+        return title_ru, summary_ru
+
+    except (ValueError, KeyError, AttributeError) as e:
+        logger.error(f"Yandex GPT вернул ответ не в формате JSON с полями title_ru и summary_ru: {e}")
+        return "", ""
     except Exception as e:
         logger.error(f"Ошибка при обработке текста через Yandex Cloud SDK: {e}", exc_info=True)
         return None
 
 
 # --- ФУНКЦИИ РАБОТЫ С БД (копируем из предыдущего кода) ---
+# Чтение идет через соединения только для чтения (свое у каждого потока пула), запись - через
+# единственное пишущее соединение db.write_transaction: в режиме WAL чтение не ждет записи
 def init_db_for_processed_text(db_name: str):
-    """Добавляет поля title_ru и processed_full_text в таблицу news, если они отсутствуют."""
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    """
+    Добавляет поля title_ru и processed_full_text в таблицу news, если они отсутствуют, и создает кэш ответов.
+    Проверка выполняется один раз за время жизни процесса.
+    """
+    if db_name in _SCHEMA_READY:
+        return
+    conn = get_connection(db_name)
     try:
-        cursor.execute("PRAGMA table_info(news)")
-        columns = [info[1] for info in cursor.fetchall()]
+        columns = [info[1] for info in conn.execute("PRAGMA table_info(news)").fetchall()]
 
         if 'title_ru' not in columns:
             logger.info("Добавление столбца 'title_ru' в таблицу 'news'...")
-            cursor.execute("ALTER TABLE news ADD COLUMN title_ru TEXT")
-            conn.commit()
+            with conn:
+                conn.execute(SQL_ADD_TITLE_RU_COLUMN)
             logger.info("Столбец 'title_ru' успешно добавлен.")
         else:
             logger.info("Столбец 'title_ru' уже существует.")
 
         if 'processed_full_text' not in columns:
             logger.info("Добавление столбца 'processed_full_text' в таблицу 'news'...")
-            cursor.execute("ALTER TABLE news ADD COLUMN processed_full_text TEXT")
-            conn.commit()
+            with conn:
+                conn.execute(SQL_ADD_PROCESSED_TEXT_COLUMN)
             logger.info("Столбец 'processed_full_text' успешно добавлен.")
         else:
             logger.info("Столбец 'processed_full_text' уже существует.")
 
+        # Кэш ответов модели: повторный запрос с тем же текстом не отправляется в API
+        with conn:
+            conn.execute(SQL_CREATE_CACHE)
+            conn.execute(SQL_CREATE_PUBLISHED_INDEX)
+        _SCHEMA_READY.add(db_name)
+
     except sqlite3.Error as e:
         logger.error(f"Ошибка при инициализации БД для обработанного текста: {e}")
-    finally:
-        conn.close()
+
+
+def get_cached_response(db_name: str, key: str) -> Optional[str]:
+    """Возвращает сохраненный ответ модели по ключу кэша или None."""
+    conn = get_read_connection(db_name)
+    try:
+        row = conn.execute(SQL_SELECT_CACHED, (key,)).fetchone()
+        return row[0] if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при чтении кэша ответов Yandex GPT: {e}")
+        return None
+
+
+def store_cached_response(db_name: str, key: str, response: str):
+    """Сохраняет ответ модели в кэш."""
+    try:
+        with write_transaction(db_name) as cursor:
+            cursor.execute(SQL_STORE_CACHED, (key, response, int(time.time())))
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при сохранении ответа Yandex GPT в кэш: {e}")
 
 
 def get_fetched_news(db_name: str):
     """Получает список новостей, полный текст которых извлечен (published = 'fetched')."""
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
+    conn = get_read_connection(db_name)
     try:
-        cursor.execute("SELECT title, full_text FROM news WHERE published = 'fetched'")
-        rows = cursor.fetchall()
+        rows = conn.execute(SQL_SELECT_FETCHED).fetchall()
         logger.info(f"Найдено {len(rows)} новостей для обработки (статус 'fetched').")
-        return [{'title': row[0], 'full_text': row[1]} for row in rows]
+        return [{'id': row[0], 'title': row[1], 'full_text': row[2]} for row in rows]
     except sqlite3.Error as e:
         logger.error(f"Ошибка при получении новостей из БД: {e}")
         return []
-    finally:
-        conn.close()
 
 
-def update_news_processed_text(db_name: str, original_title: str, title_ru: str, processed_full_text: str):
+def set_news_processing(db_name: str, news_id: int, processing: bool):
     """
-    Обновляет переведенный заголовок и обработанный полный текст новости и устанавливает статус 'processed'.
+    Отмечает новость как отправленную в обработку (статус 'processing')
+    или возвращает ее в очередь (статус 'fetched').
     """
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
     try:
-        cursor.execute(
-            "UPDATE news SET title_ru = ?, processed_full_text = ?, published = 'processed' WHERE title = ?",
-            (title_ru, processed_full_text, original_title)
-        )
-        conn.commit()
-        if cursor.rowcount > 0:
-            logger.info(f"✔️ Новость '{original_title[:50]}...' обновлена в БД (статус: processed).")
-        else:
-            logger.warning(
-                f"Новость '{original_title[:50]}...' не найдена в БД при попытке обновления processed текста.")
+        with write_transaction(db_name) as cursor:
+            cursor.execute(SQL_MARK_PROCESSING if processing else SQL_RELEASE_PROCESSING, (news_id,))
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка БД при смене статуса новости {news_id}: {e}")
+
+
+def mark_news_process_failed(db_name: str, news_id: int):
+    """Отмечает новость, которую модель не смогла обработать (статус 'process_failed')."""
+    try:
+        with write_transaction(db_name) as cursor:
+            cursor.execute(SQL_MARK_PROCESS_FAILED, (news_id,))
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка БД при смене статуса новости {news_id}: {e}")
+
+
+def reclaim_processing_news(db_name: str) -> int:
+    """
+    Возвращает в очередь ('fetched') новости, оставшиеся в статусе 'processing'
+    после прерванного запуска. Возвращает их количество.
+    """
+    try:
+        with write_transaction(db_name) as cursor:
+            reclaimed = cursor.execute(SQL_RECLAIM_PROCESSING).rowcount
+        if reclaimed:
+            logger.warning(f"Возвращено в очередь {reclaimed} новостей, обработка которых была прервана.")
+        return reclaimed
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка БД при возврате прерванных новостей: {e}")
+        return 0
+
+
+def update_news_processed_text_batch(db_name: str, rows: list) -> int:
+    """
+    Сохраняет пачку обработанных новостей одной транзакцией и устанавливает им статус 'processed'.
+    rows - кортежи (title_ru, processed_full_text, id новости).
+    Возвращает количество обновленных новостей.
+    """
+    try:
+        # При ошибке транзакция откатывается
+        with write_transaction(db_name) as cursor:
+            updated = cursor.executemany(SQL_UPDATE_PROCESSED, rows).rowcount
+        logger.info(f"✔️ Сохранено в БД: {updated} новостей (статус: processed).")
+        if updated < len(rows):
+            # Какие новости не нашлись, выясняется отдельным запросом только в этом редком случае
+            conn = get_read_connection(db_name)
+            missing = [row[2] for row in rows if conn.execute(SQL_SELECT_NEWS_ID, (row[2],)).fetchone() is None]
+            logger.warning(f"Новости не найдены в БД при попытке обновления processed текста (id: {missing}).")
+        return updated
     except sqlite3.Error as e:
-        logger.error(f"Ошибка БД при обновлении processed текста новости '{original_title[:50]}...': {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        logger.error(f"Ошибка БД при сохранении пачки из {len(rows)} обработанных новостей: {e}")
+        return 0
 
 
 # --- ОСНОВНАЯ ЛОГИКА ---
-def process_texts_with_yacloud_sdk():
+def process_news_item(news_item: dict, endpoint: YandexEndpoint) -> Optional[Tuple[str, str, int]]:
+    """
+    Переводит заголовок и обрабатывает текст одной новости.
+    Возвращает строку для сохранения (title_ru, processed_full_text, id новости) или None.
+    """
+    original_title = news_item['title']
+    full_text = news_item['full_text']
+
+    logger.info(f"--- Обработка: {original_title[:50]}... ---")
+
+    if not full_text or len(full_text.strip()) < MIN_INPUT_CHARS:
+        logger.warning(f"Полный текст отсутствует или короче {MIN_INPUT_CHARS} символов "
+                       f"для '{original_title[:50]}...'. Обрабатываем только заголовок.")
+
+    # Статус 'processing' сохраняется до запроса: если процесс прервется,
+    # новость вернется в очередь при следующем запуске
+    set_news_processing(DB_NAME, news_item['id'], True)
+
+    # Заголовок и текст обрабатываются одним запросом
+    result = process_text_with_yacloud_sdk(original_title, full_text, endpoint)
+    if result is None:  # None означает ошибку запроса: новость вернется в очередь
+        logger.warning(f"Не удалось обработать новость '{original_title[:50]}...'. Пропуск.")
+        set_news_processing(DB_NAME, news_item['id'], False)
+        return None
+    translated_title, final_processed_text = result
+
+    if not translated_title:
+        # Ответ модели без заголовка (в том числе не в формате JSON) при повторе не изменится
+        logger.warning(f"Не удалось перевести заголовок для '{original_title[:50]}...'. Статус 'process_failed'.")
+        mark_news_process_failed(DB_NAME, news_item['id'])
+        return None
+    # Пустой пересказ от модели будет сохранен как есть
+
+    return translated_title, final_processed_text, news_item['id']
+
+
+async def process_texts_with_yacloud_sdk():
     """Основная функция обработки текстов новостей с помощью Yandex Cloud SDK."""
     logger.info("=== Начало обработки текстов новостей через Yandex Cloud SDK ===")
 
     # 1. Инициализируем БД
     init_db_for_processed_text(DB_NAME)
+    # Прерванные прошлым запуском новости снова попадают в выборку 'fetched'
+    reclaim_processing_news(DB_NAME)
 
     # 2. Получаем список новостей для обработки
     fetched_news = get_fetched_news(DB_NAME)
@@ -166,76 +509,40 @@ def process_texts_with_yacloud_sdk():
         return
 
     logger.info(f"Найдено {len(fetched_news)} новостей для обработки.")
+    loop = asyncio.get_running_loop()
+    executor = get_sdk_executor()
+    # Пул свободных слотов: каждый каталог представлен YAGPT_CONCURRENCY раз, поэтому у каждого каталога
+    # свой предел одновременных запросов, а новость получает первый освободившийся слот любого каталога
+    free_endpoints = asyncio.Queue()
+    for endpoint in get_endpoints():
+        for _ in range(YAGPT_CONCURRENCY):
+            free_endpoints.put_nowait(endpoint)
+    # Обработанные, но еще не сохраненные новости
+    pending = []
     processed_count = 0
 
-    # 3. Обрабатываем каждую новость
-    for news_item in fetched_news:
-        original_title = news_item['title']
-        full_text = news_item['full_text']
-
-        logger.info(f"--- Обработка: {original_title[:50]}... ---")
-
-        # --- Обработка заголовка ---
-        # Передаем заголовок отдельно для перевода (без пересказа)
-        title_messages = [
-            {
-                "role": "system",
-                "text": "Ты профессиональный переводчик. Переведи следующий английский заголовок на русский язык. Сохрани все имена собственные (людей, компаний, продуктов) в оригинальном английском виде. Верни только переведенный заголовок.",
-            },
-            {
-                "role": "user",
-                "text": original_title,
-            },
-        ]
+    async def flush():
+        """Сохраняет накопленные новости одной транзакцией"""
+        nonlocal pending, processed_count
+        rows, pending = pending, []
+        processed_count += await asyncio.to_thread(update_news_processed_text_batch, DB_NAME, rows)
 
+    async def handle(news_item: dict):
+        # SDK синхронный, поэтому запросы выполняются в отдельном пуле потоков
+        endpoint = await free_endpoints.get()
         try:
-            sdk = YCloudML(folder_id=YC_FOLDER_ID, auth=YC_API_KEY)
-            title_result = (
-                sdk.models.completions("yandexgpt-lite")
-                .configure(temperature=0.3, max_tokens=200)
-                .run(title_messages)
-            )
-            # --- ИСПРАВЛЕННЫЙ ФРАГМЕНТ ---
-            # Попробуем получить текст напрямую
-            # Если title_result - это объект с атрибутом text
-            if hasattr(title_result, 'text'):
-                translated_title = title_result.text.strip()
-            # Если title_result - это список или генератор
-            elif hasattr(title_result, '__iter__'):
-                # Берем первый элемент, если это итерируемый объект
-                first_alt = next(iter(title_result))
-                translated_title = first_alt.text.strip()
-            else:
-                # Если это какой-то другой формат, попробуем str()
-                translated_title = str(title_result).strip()
-            # --- КОНЕЦ ИСПРАВЛЕННОГО ФРАГМЕНТА ---
-        except Exception as e:
-            logger.error(f"Ошибка при переводе заголовка '{original_title[:50]}...': {e}")
-            translated_title = original_title  # На случай ошибки, оставляем оригинал
-
-        if not translated_title:
-            logger.warning(f"Не удалось перевести заголовок для '{original_title[:50]}...'. Пропуск.")
-            continue
-
-        # --- Обработка полного текста ---
-        if not full_text:
-            logger.warning(f"Полный текст отсутствует для '{original_title[:50]}...'. Пропуск.")
-            # Можно сохранить только переведенный заголовок, но по логике он нужен для 'processed'
-            # continue
-
-        # Используем объединенную функцию для перевода и пересказа
-        final_processed_text = process_text_with_yacloud_sdk(full_text)
-        if final_processed_text is None:  # None означает ошибку
-            logger.warning(f"Не удалось обработать полный текст для '{original_title[:50]}...'. Пропуск.")
-            continue
-        # Пустая строка от модели будет сохранена как есть
-
-        # --- Сохранение ---
-        update_news_processed_text(DB_NAME, original_title, translated_title, final_processed_text)
-        processed_count += 1
-
-        # Небольшая задержка между запросами к API
-        time.sleep(1)
+            row = await loop.run_in_executor(executor, process_news_item, news_item, endpoint)
+        finally:
+            free_endpoints.put_nowait(endpoint)
+        if row is not None:
+            pending.append(row)
+            if len(pending) >= UPDATE_BATCH_SIZE:
+                await flush()
+
+    # 3. Обрабатываем новости параллельно, результаты сохраняются пачками по UPDATE_BATCH_SIZE
+    await asyncio.gather(*(handle(news_item) for news_item in fetched_news))
+    if pending:
+        await flush()
 
     logger.info(f"=== ✔️ Обработка текстов через Yandex Cloud SDK завершена. Обработано: {processed_count} ===")
 
@@ -248,6 +555,8 @@ if __name__ == "__main__":
     # export YC_API_KEY=ваш_api_key
     # python yc_processor_sdk.py
     #
+    # Несколько каталогов (квоты складываются): export YC_FOLDER_IDS=id1,id2 и YC_API_KEYS=key1,key2
+    #
     # Windows (cmd):
     # set YC_FOLDER_ID=ваш_folder_id
     # set YC_API_KEY=ваш_api_key
@@ -257,4 +566,5 @@ if __name__ == "__main__":
     # $env:YC_FOLDER_ID="ваш_folder_id"
     # $env:YC_API_KEY="ваш_api_key"
     # python yc_processor_sdk.py
-    process_texts_with_yacloud_sdk()
+    _config()
+    asyncio.run(process_texts_with_yacloud_sdk())